@@ -0,0 +1,80 @@
+"""Queries-per-second of DatabaseManager with and without the connection pool.
+
+Usage: python benchmarks/bench_connection_pool.py [--queries N] [--threads N]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_operations import DatabaseManager
+from database.db_setup import init_db
+
+class UnpooledDatabaseManager(DatabaseManager):
+    """The pre-pool behaviour: a fresh connection per query."""
+
+    def _get_connection(self):
+        return sqlite3.connect(self.db_name)
+
+    def _release_connection(self, conn):
+        conn.close()
+
+def seed(db: DatabaseManager, users: int):
+    for telegram_id in range(1, users + 1):
+        db.register_user(telegram_id, f"user{telegram_id}", f"User {telegram_id}")
+        db.save_recipe({
+            'title': f"قورمه سبزی {telegram_id}",
+            'ingredients': "سبزی، لوبیا، گوشت",
+            'cooking_time': 120,
+            'skill_level': 'متوسط',
+            'calories': 450,
+            'instructions': "همه مواد را با هم بپزید.",
+        }, telegram_id)
+
+def run(db: DatabaseManager, queries: int, threads: int, users: int) -> float:
+    per_thread = queries // threads
+
+    def worker(offset):
+        for i in range(per_thread):
+            telegram_id = (offset + i) % users + 1
+            db.is_user_registered(telegram_id)
+            db.get_recipe_details(telegram_id)
+
+    workers = [threading.Thread(target=worker, args=(n * per_thread,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return (per_thread * threads * 2) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        init_db(os.path.join(tmp, "recipes.db"))
+        db_path = os.path.join(tmp, "recipes.db")
+        pooled = DatabaseManager(db_path)
+        seed(pooled, args.users)
+
+        unpooled = UnpooledDatabaseManager(db_path)
+        before = run(unpooled, args.queries, args.threads, args.users)
+        after = run(pooled, args.queries, args.threads, args.users)
+
+    print(f"queries: {args.queries * 2}, threads: {args.threads}")
+    print(f"open/close per query: {before:,.0f} q/s")
+    print(f"pooled connections:   {after:,.0f} q/s")
+    print(f"speedup:              {after / before:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""DatabaseManager latency and throughput as the tables grow.
+
+Grows one database through each scale of --scales recipes, with a user per
+ten recipes (at least 1000) and a favorite per recipe, all from
+benchmarks/datagen.py. At each scale it times the calls behind the bot's
+main screens:
+
+  search_recipes      a first page of results for a common term
+  search_next_page    a later page of a search, from its ranked ids
+  get_user_recipes    a first page of /my_recipes
+  get_recipe_details  a recipe opened by id
+  patch_recipe        a recipe's title edited by its owner
+  save_recipe         a new recipe
+
+each from a single thread and from --threads threads sharing the manager.
+Every case stops after --ops calls or --seconds, whichever comes first.
+
+Results go to --output as JSON, together with the commit and the SQLite
+version. To compare two commits, pass the earlier file as --baseline and the
+ratio of each case's p50 is printed next to it.
+
+Usage: python benchmarks/bench_db.py [--scales 10000,100000,1000000] [--threads N]
+                                     [--output results.json] [--baseline old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datagen import generate_favorites, generate_recipes, generate_users, recipe_row
+from database.db_operations import DatabaseManager
+from database.db_setup import init_db
+from database.writer import get_writer
+from utils.pager import PAGE_SIZE
+
+SEARCH_TERMS = ["قورمه", "زعفران", "بادمجان کشک", "مرغ", "رب انار", "پلو"]
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def run_case(call: Callable[[random.Random], None], threads: int, ops: int, seconds: float) -> dict:
+    """Run `call` up to `ops` times over `threads` threads; latency percentiles in ms"""
+    latencies: List[float] = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(n: int):
+        rng = random.Random(n)
+        mine = []
+        for _ in range(ops // threads):
+            start = time.perf_counter()
+            call(rng)
+            mine.append(time.perf_counter() - start)
+            if start > deadline:
+                break
+        with lock:
+            latencies.extend(mine)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        'threads': threads,
+        'ops': len(latencies),
+        'ops_per_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+def cases(db: DatabaseManager, recipes: int, users: int, owned: Dict[int, int]) -> Dict[str, Callable]:
+    """The timed calls, each taking the calling thread's random generator"""
+    owned_ids = list(owned)
+    ranked = {term: db.search_recipe_ids(term) for term in SEARCH_TERMS}
+
+    def save(rng: random.Random):
+        title, ingredients, cooking_time, skill_level, calories, instructions, owner_id = \
+            recipe_row(rng, rng.randint(0, 10 ** 9), rng.randint(1, users))
+        db.save_recipe({
+            'title': title, 'ingredients': ingredients, 'cooking_time': cooking_time,
+            'skill_level': skill_level, 'calories': calories, 'instructions': instructions,
+            'instruction_voice': None, 'voice_file_id': None, 'image_path': None, 'image_file_id': None,
+        }, owner_id)
+
+    def patch(rng: random.Random):
+        recipe_id = rng.choice(owned_ids)
+        db.patch_recipe(recipe_id, owned[recipe_id], title=f"قیمه ویژه {rng.randint(0, 10 ** 6)}")
+
+    return {
+        'search_recipes': lambda rng: db.search_recipes(rng.choice(SEARCH_TERMS), limit=PAGE_SIZE + 1),
+        'search_next_page': lambda rng: db.get_search_results(
+            ranked[rng.choice(SEARCH_TERMS)][PAGE_SIZE:2 * PAGE_SIZE + 1]
+        ),
+        'get_user_recipes': lambda rng: db.get_user_recipes(rng.randint(1, users), limit=PAGE_SIZE + 1),
+        'get_recipe_details': lambda rng: db.get_recipe_details(rng.randint(1, recipes)),
+        'patch_recipe': patch,
+        'save_recipe': save,
+    }
+
+def grow(conn: sqlite3.Connection, have: Dict[str, int], recipes: int):
+    """Bring the database from the counts in `have` up to `recipes` recipes"""
+    users = max(1000, recipes // 10)
+    generate_users(conn, users - have['users'], first_id=have['users'] + 1)
+    generate_recipes(conn, recipes - have['recipes'], owners=users, seed=recipes, first=have['recipes'])
+    generate_favorites(conn, recipes - have['recipes'], users, recipes, seed=recipes)
+    have.update(users=users, recipes=recipes)
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except OSError:
+        return ''
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', default='10000,100000,1000000', help="recipe counts, ascending")
+    parser.add_argument('--threads', type=int, default=8, help="threads of the concurrent runs")
+    parser.add_argument('--ops', type=int, default=2000, help="calls per case")
+    parser.add_argument('--seconds', type=float, default=10, help="time limit per case")
+    parser.add_argument('--output', default='bench_db.json')
+    parser.add_argument('--baseline', help="earlier --output file to compare against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = {(r['recipes'], r['operation'], r['threads']): r for r in json.load(f)['results']}
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "recipes.db")
+        init_db(db_path)
+        db = DatabaseManager(db_path)
+        have = {'users': 0, 'recipes': 0}
+
+        print(f"{'recipes':>9} {'operation':<20} {'threads':>7} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for recipes in (int(n) for n in args.scales.split(',')):
+            conn = db._get_connection()
+            try:
+                start = time.perf_counter()
+                grow(conn, have, recipes)
+                conn.execute("ANALYZE")
+                seed_seconds = time.perf_counter() - start
+                owned = dict(conn.execute(
+                    "SELECT id, owner_id FROM recipes ORDER BY random() LIMIT 1000"
+                ).fetchall())
+            finally:
+                db._release_connection(conn)
+            size = sum(os.path.getsize(db_path + ext) for ext in ('', '-wal') if os.path.exists(db_path + ext))
+            print(f"{recipes:>9,} seeded in {seed_seconds:.1f}s, database {size / 1e6:,.0f} MB")
+
+            for operation, call in cases(db, recipes, have['users'], owned).items():
+                for threads in (1, args.threads):
+                    result = {'recipes': recipes, 'operation': operation,
+                              **run_case(call, threads, args.ops, args.seconds)}
+                    results.append(result)
+                    line = (f"{recipes:>9,} {operation:<20} {threads:>7} {result['ops_per_s']:>9,.0f} "
+                            f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+                    before = baseline.get((recipes, operation, threads))
+                    if before and before['p50_ms']:
+                        line += f"  p50 x{result['p50_ms'] / before['p50_ms']:.2f} vs baseline"
+                    print(line)
+
+        get_writer(db_path).close()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': git_commit(),
+            'sqlite': sqlite3.sqlite_version,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+            'results': results,
+        }, f, indent=2)
+    print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Handler throughput of the whole bot, per user flow.
+
+Builds the real Application with bot.build_application() against
+benchmarks/stub_bot.py, which records the outbound calls instead of sending
+them, seeds a database with users and recipes, then replays synthetic
+update streams for each flow:
+
+  registration  /start, username
+  add_recipe    /add_recipe through the nine steps, without media
+  search        /search_recipes, a query, /cancel
+  my_recipes    /my_recipes
+  edit          the edit button, "title", the new title
+
+Sessions of a flow run concurrently, each as a different user sending its
+updates one after the other; every update is timed from Application.process_update()
+until its handler finished. Per flow it reports updates/s and p50/p99 per update.
+
+--record FILE writes the synthetic updates as JSON lines. --replay FILE runs
+a file of Telegram updates in that format instead, e.g. request bodies
+logged in webhook mode, keeping each user's updates in order; results are
+grouped by command or callback. --db runs against a copy of an existing
+database rather than a seeded one.
+
+Usage: python benchmarks/bench_e2e.py [--sessions N] [--concurrency N] [--rtt MS]
+       python benchmarks/bench_e2e.py --replay updates.jsonl [--db recipes.db]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder
+from benchmarks.stub_bot import STUB_TOKEN, StubRequest, StubTelegram, callback_update, command_update
+
+# Users 1..USERS are seeded; registration uses ids above them
+USERS = 1000
+NEW_USERS = 1_000_000
+
+def flow_updates(flow: str, user_id: int, recipe_id: int, update_ids) -> List[dict]:
+    """The updates one user sends to go through `flow`"""
+    text = lambda value: command_update(next(update_ids), user_id, value)
+    press = lambda data: callback_update(next(update_ids), user_id, data)
+    if flow == 'registration':
+        return [text('/start'), text(f"cook{user_id}")]
+    if flow == 'add_recipe':
+        return [
+            text('/add_recipe'), text(f"کوکو سبزی {user_id}"), text("سبزی کوکو، تخم مرغ، گردو، زرشک"),
+            text('40'), text('🟢 مبتدی'), text('320'), text("سبزی را با تخم مرغ هم بزنید و سرخ کنید."),
+            text('خیر'), text('/skip'),
+        ]
+    if flow == 'search':
+        return [text('/search_recipes'), text('قورمه'), text('/cancel')]
+    if flow == 'my_recipes':
+        return [text('/my_recipes')]
+    if flow == 'edit':
+        return [press(f"edit_recipe_{recipe_id}"), press(f"edit_{recipe_id}_title"), text(f"قیمه ویژه {user_id}")]
+    raise ValueError(flow)
+
+FLOWS = ('registration', 'add_recipe', 'search', 'my_recipes', 'edit')
+
+def update_kind(data: dict) -> str:
+    """Command, callback prefix or update type, to group replayed updates by"""
+    if 'callback_query' in data:
+        return 'callback:' + re.sub(r'_?[0-9].*$', '', data['callback_query'].get('data', ''))
+    message = data.get('message') or {}
+    text = message.get('text', '')
+    if text.startswith('/'):
+        return text.split()[0].split('@')[0]
+    return next(iter(key for key in data if key != 'update_id'), 'unknown')
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+async def run_streams(app, streams: List[List[dict]], concurrency: int) -> Dict[str, List[float]]:
+    """Process each stream in order, up to `concurrency` at once; latencies by update kind"""
+    slots = asyncio.Semaphore(concurrency)
+    latencies: Dict[str, List[float]] = {}
+
+    async def run(stream):
+        async with slots:
+            for data in stream:
+                update = Update.de_json(data, app.bot)
+                start = time.perf_counter()
+                await app.process_update(update)
+                latencies.setdefault(update_kind(data), []).append(time.perf_counter() - start)
+
+    await asyncio.gather(*(run(stream) for stream in streams))
+    return latencies
+
+def report(label: str, latencies: List[float], elapsed: float = None, calls: int = None, errors: float = None):
+    """One row of the results table; the columns left as None are left blank"""
+    rate = f"{len(latencies) / elapsed:,.0f}" if elapsed else ''
+    per_update = f"{calls / len(latencies):.2f}" if calls is not None else ''
+    print(
+        f"{label:<22} {len(latencies):>7,} {rate:>10} "
+        f"{percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f} "
+        f"{per_update:>10} {'' if errors is None else f'{errors:g}':>7}"
+    )
+
+def seed(db_path: str, recipes: int):
+    from benchmarks.datagen import generate_recipes, generate_users
+    from database.db_operations import DatabaseManager
+    db = DatabaseManager(db_path)
+    conn = db._get_connection()
+    try:
+        generate_users(conn, USERS)
+        generate_recipes(conn, recipes, owners=USERS)
+    finally:
+        db._release_connection(conn)
+
+def owned_recipes(db_path: str) -> Dict[int, int]:
+    from database.db_operations import DatabaseManager
+    db = DatabaseManager(db_path)
+    conn = db._get_connection()
+    try:
+        return dict(conn.execute("SELECT owner_id, MIN(id) FROM recipes GROUP BY owner_id").fetchall())
+    finally:
+        db._release_connection(conn)
+
+async def bench(args, db_path: str):
+    import bot
+    from utils.metrics import metrics
+    from utils.workers import routing_key
+
+    telegram = StubTelegram(args.rtt / 1000)
+    app = bot.build_application(
+        ApplicationBuilder().token(STUB_TOKEN).request(StubRequest(telegram)).updater(None)
+    )
+    await app.initialize()
+    await bot.on_startup(app)
+    await app.start()
+
+    def calls() -> int:
+        return sum(telegram.calls.values())
+
+    def errors() -> float:
+        return sum(metrics.counters('bot_handler_errors_total').values())
+
+    print(f"{'':<22} {'updates':>7} {'updates/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'calls/upd':>10} {'errors':>7}")
+    try:
+        if args.replay:
+            with open(args.replay, encoding='utf-8') as f:
+                updates = [json.loads(line) for line in f if line.strip()]
+            streams: Dict[int, List[dict]] = {}
+            for data in updates:
+                streams.setdefault(routing_key(data), []).append(data)
+            calls_before, errors_before = calls(), errors()
+            start = time.perf_counter()
+            latencies = await run_streams(app, list(streams.values()), args.concurrency)
+            elapsed = time.perf_counter() - start
+            for kind, values in sorted(latencies.items(), key=lambda item: -len(item[1])):
+                report(kind, values)
+            report('total', [v for values in latencies.values() for v in values], elapsed,
+                   calls() - calls_before, errors() - errors_before)
+            return
+
+        owners = owned_recipes(db_path)
+        users = sorted(owners)[:args.sessions]
+        update_ids = itertools.count(1)
+        recorded = []
+        for flow in args.flows.split(','):
+            first = NEW_USERS if flow == 'registration' else 0
+            streams = [
+                flow_updates(flow, first + user_id, owners[user_id], update_ids)
+                for user_id in users
+            ]
+            recorded += [data for stream in streams for data in stream]
+            calls_before, errors_before = calls(), errors()
+            start = time.perf_counter()
+            latencies = await run_streams(app, streams, args.concurrency)
+            elapsed = time.perf_counter() - start
+            report(flow, [v for values in latencies.values() for v in values], elapsed,
+                   calls() - calls_before, errors() - errors_before)
+
+        if args.record:
+            with open(args.record, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(data, ensure_ascii=False) + '\n' for data in recorded)
+    finally:
+        await app.stop()
+        await bot.on_stop(app)
+        # After shutdown(), which makes the last persistence flush, as in run_polling
+        await app.shutdown()
+        await bot.on_shutdown(app)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=500, help="users going through each flow")
+    parser.add_argument('--concurrency', type=int, default=50, help="sessions in flight at once")
+    parser.add_argument('--recipes', type=int, default=20000)
+    parser.add_argument('--flows', default=','.join(FLOWS))
+    parser.add_argument('--rtt', type=float, default=0, help="simulated Bot API round trip in ms")
+    parser.add_argument('--record', help="write the synthetic updates to this file")
+    parser.add_argument('--replay', help="run the updates in this file (JSON lines) instead")
+    parser.add_argument('--db', help="run against a copy of this database instead of a seeded one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Read by the handler modules when they are imported
+        db_path = os.environ['DB_NAME'] = os.path.join(tmp, "recipes.db")
+        os.environ['MEDIA_ROOT'] = os.path.join(tmp, "media")
+        # Replies go to the stub; Telegram's rate limits would be the only thing measured
+        os.environ['OUTBOUND_GLOBAL_RATE'] = '1000000'
+        os.environ['OUTBOUND_CHAT_RATE'] = '1000000'
+        os.environ['METRICS_PORT'] = '0'
+
+        from database.db_setup import init_db
+        if args.db:
+            shutil.copy(args.db, db_path)
+        init_db(db_path)
+        if not args.db:
+            seed(db_path, args.recipes)
+
+        print(f"sessions per flow: {args.sessions}, concurrency: {args.concurrency}, simulated rtt: {args.rtt:g} ms")
+        asyncio.run(bench(args, db_path))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Flush cost and restart time of SQLitePersistence with many active conversations.
+
+Every simulated user is midway through the add-recipe flow: one conversation
+state plus a user_data draft. Measures
+  - a full flush of all of them (first save after a busy period),
+  - a typical interval flush where a fraction of them changed,
+  - startup: loading the conversation states, compared to also loading all
+    user_data eagerly as python-telegram-bot's get_user_data() would,
+  - the lazy per-user load on a user's first update after the restart.
+
+Usage: python benchmarks/bench_persistence.py [--conversations N] [--dirty N]
+"""
+import argparse
+import asyncio
+import os
+import pickle
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_setup import init_db
+from database.persistence import SQLitePersistence
+from database.writer import get_writer
+
+NAME = 'add_recipe'
+
+def draft(user_id: int) -> dict:
+    return {
+        'title': f"قورمه سبزی {user_id}",
+        'ingredients': "سبزی قورمه، لوبیا قرمز، گوشت گوسفندی، پیاز، لیمو عمانی",
+        'cooking_time': '120',
+        'skill_level': '🟡 متوسط',
+        'calories': 450,
+        'pagers': {1000 + user_id: {'kind': 'my_recipes', 'params': {'telegram_id': user_id},
+                                    'cursors': [None, ('2024-01-01 12:00:00', user_id)], 'page': 0}},
+    }
+
+async def stage(persistence: SQLitePersistence, user_ids, state: int):
+    for user_id in user_ids:
+        await persistence.update_conversation(NAME, (user_id, user_id), state)
+        await persistence.update_user_data(user_id, draft(user_id))
+
+async def timed_flush(persistence: SQLitePersistence) -> float:
+    start = time.perf_counter()
+    await persistence.flush()
+    return time.perf_counter() - start
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--conversations', type=int, default=100000)
+    parser.add_argument('--dirty', type=int, default=1000, help="changed conversations per interval flush")
+    args = parser.parse_args()
+    users = range(1, args.conversations + 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "recipes.db")
+        init_db(db_path)
+
+        persistence = SQLitePersistence(db_path)
+        await stage(persistence, users, 3)
+        full = await timed_flush(persistence)
+
+        await stage(persistence, range(1, args.dirty + 1), 4)
+        interval = await timed_flush(persistence)
+
+        # Restart: a fresh persistence on the same file
+        restarted = SQLitePersistence(db_path)
+        start = time.perf_counter()
+        conversations = await restarted.get_conversations(NAME)
+        startup = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rows = restarted._read("SELECT user_id, data FROM persisted_user_data")
+        eager = {user_id: pickle.loads(data) for user_id, data in rows}
+        eager_load = time.perf_counter() - start
+
+        first_update = []
+        for user_id in range(1, 1001):
+            data = {}
+            start = time.perf_counter()
+            await restarted.refresh_user_data(user_id, data)
+            first_update.append(time.perf_counter() - start)
+        assert data == eager[1000]
+
+        get_writer(db_path).close()
+        size = os.path.getsize(db_path) + os.path.getsize(db_path + '-wal')
+
+    print(f"active conversations: {len(conversations):,}, database: {size / 1e6:.0f} MB")
+    print(f"full flush ({args.conversations:,} states + drafts): {full * 1000:,.0f} ms")
+    print(f"interval flush ({args.dirty:,} changed):       {interval * 1000:,.1f} ms")
+    print(f"startup, conversation states:             {startup * 1000:,.0f} ms")
+    print(f"startup if user_data were loaded eagerly: +{eager_load * 1000:,.0f} ms")
+    print(f"lazy user_data load on first update:      {statistics.median(first_update) * 1000:.2f} ms median")
+
+if __name__ == "__main__":
+    asyncio.run(main())
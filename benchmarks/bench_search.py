@@ -0,0 +1,64 @@
+"""Compare the FTS5 search path against the old LIKE scan.
+
+Usage: python benchmarks/bench_search.py [--recipes N] [--rounds N]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datagen import generate_recipes
+from database.db_operations import DatabaseManager
+from database.db_setup import init_db
+
+QUERIES = ["قورمه", "زعفران", "بادمجان کشک", "مرغ", "رب انار", "دم"]
+
+def like_search(conn: sqlite3.Connection, search_term: str):
+    """The search query used before the full-text index."""
+    pattern = f'%{search_term.lower()}%'
+    return conn.execute("""
+        SELECT r.id, r.title, r.ingredients, r.cooking_time, r.skill_level,
+               r.calories, r.image_path, r.owner_id, u.username
+        FROM recipes r
+        LEFT JOIN users u ON r.owner_id = u.telegram_id
+        WHERE LOWER(r.title) LIKE ?
+           OR LOWER(r.ingredients) LIKE ?
+           OR LOWER(r.instructions) LIKE ?
+        ORDER BY r.created_at DESC
+    """, (pattern, pattern, pattern)).fetchall()
+
+def timed(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for term in QUERIES:
+            fn(term)
+    return (time.perf_counter() - start) / (rounds * len(QUERIES)) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        init_db(os.path.join(tmp, "recipes.db"))
+        db = DatabaseManager(os.path.join(tmp, "recipes.db"))
+        conn = db._get_connection()
+
+        start = time.perf_counter()
+        generate_recipes(conn, args.recipes)
+        print(f"seeded {args.recipes:,} recipes in {time.perf_counter() - start:.1f}s")
+
+        like_ms = timed(lambda term: like_search(conn, term), args.rounds)
+        fts_ms = timed(db.search_recipes, args.rounds)
+
+    print(f"LIKE scan:  {like_ms:8.2f} ms/query")
+    print(f"FTS5 bm25:  {fts_ms:8.2f} ms/query")
+    print(f"speedup:    {like_ms / fts_ms:8.1f}x")
+
+if __name__ == "__main__":
+    main()
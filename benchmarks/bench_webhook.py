@@ -0,0 +1,130 @@
+"""Update-to-reply latency of the whole bot, polling vs webhook.
+
+Runs bot.build_application() against benchmarks/stub_bot.py, which plays the
+Telegram API with a simulated round-trip time. Chats send /profile at a
+steady rate; latency runs from the moment an update exists at "Telegram" to
+the moment the bot's reply reaches it. Polling picks the update up with
+getUpdates; the webhook delivers it by POST to utils/webhook.py.
+
+Usage: python benchmarks/bench_webhook.py [--updates N] [--rate N] [--rtt MS]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Handler modules open the database named here when they are imported
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DB_NAME'] = os.path.join(_tmp.name, "recipes.db")
+os.environ['MEDIA_ROOT'] = os.path.join(_tmp.name, "media")
+
+import aiohttp
+from telegram.ext import ApplicationBuilder
+from benchmarks.stub_bot import STUB_TOKEN, StubRequest, StubTelegram, command_update
+from database.db_operations import DatabaseManager
+from database.db_setup import init_db
+from utils.webhook import SECRET_HEADER, WebhookServer, serve_webhook
+import bot
+
+SECRET = 'bench-secret'
+FIRST_USER = 1000
+
+def build(telegram: StubTelegram):
+    return bot.build_application(
+        ApplicationBuilder().token(STUB_TOKEN)
+        .request(StubRequest(telegram))
+        .get_updates_request(StubRequest(telegram))
+    )
+
+async def wait_for_replies(telegram: StubTelegram, sent: dict, timeout: float = 30):
+    deadline = time.perf_counter() + timeout
+    while len(telegram.replies) < len(sent) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    return [telegram.replies[chat][0] - sent[chat] for chat in sent if chat in telegram.replies]
+
+async def send_updates(count: int, rate: float, deliver):
+    """Create one update per chat every 1/rate seconds; returns {chat_id: creation time}"""
+    sent = {}
+    tasks = []
+    for n in range(count):
+        chat_id = FIRST_USER + n
+        sent[chat_id] = time.perf_counter()
+        tasks.append(asyncio.create_task(deliver(command_update(n + 1, chat_id, '/profile'))))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+    return sent
+
+async def run_polling(count: int, rate: float, rtt: float) -> list:
+    telegram = StubTelegram(rtt)
+    app = build(telegram)
+    await app.initialize()
+    await app.updater.start_polling(poll_interval=0, timeout=10)
+    await app.start()
+    try:
+        async def deliver(update):
+            telegram.push_update(update)
+
+        sent = await send_updates(count, rate, deliver)
+        return await wait_for_replies(telegram, sent)
+    finally:
+        await app.updater.stop()
+        await app.stop()
+        await app.shutdown()
+
+async def run_webhook(count: int, rate: float, rtt: float) -> list:
+    telegram = StubTelegram(rtt)
+    app = build(telegram)
+    server = WebhookServer(app, SECRET, listen='127.0.0.1', port=0)
+    stop = asyncio.Event()
+    serving = asyncio.create_task(serve_webhook(app, server, url='', stop=stop))
+    while not server.port:
+        await asyncio.sleep(0.01)
+    try:
+        async with aiohttp.ClientSession() as session:
+            url = f"http://127.0.0.1:{server.port}{server.path}"
+
+            async def deliver(update):
+                # Telegram's leg to us takes half a round trip, like getUpdates' response
+                await asyncio.sleep(rtt / 2)
+                async with session.post(url, json=update, headers={SECRET_HEADER: SECRET}) as response:
+                    assert response.status == 200, response.status
+
+            sent = await send_updates(count, rate, deliver)
+            return await wait_for_replies(telegram, sent)
+    finally:
+        stop.set()
+        await serving
+
+def report(name: str, latencies: list, expected: int):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else float('nan')
+    print(f"{name:8} replies: {len(latencies)}/{expected}, "
+          f"median {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms")
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=20, help="updates per second (Telegram allows ~30 replies/s)")
+    parser.add_argument('--rtt', type=float, default=50, help="simulated Bot API round trip in ms")
+    args = parser.parse_args()
+    rtt = args.rtt / 1000
+
+    init_db(os.environ['DB_NAME'])
+    db = DatabaseManager(os.environ['DB_NAME'])
+    for n in range(args.updates):
+        db.register_user(FIRST_USER + n, f"user{n}", f"User {n}")
+
+    polling = await run_polling(args.updates, args.rate, rtt)
+    webhook = await run_webhook(args.updates, args.rate, rtt)
+
+    print(f"updates: {args.updates} at {args.rate:g}/s, simulated rtt: {args.rtt:g} ms")
+    report('polling', polling, args.updates)
+    report('webhook', webhook, args.updates)
+
+if __name__ == "__main__":
+    asyncio.run(main())
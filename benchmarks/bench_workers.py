@@ -0,0 +1,75 @@
+"""Updates per second of the supervisor with 1..N worker processes.
+
+A synthetic stream of /profile commands from distinct chats is routed by
+utils/workers.Supervisor to workers that each run the full handler tree
+against benchmarks/stub_bot.py. The clock stops when every worker has
+handled its share and exited. With --rtt 0 handlers are CPU-bound, so the
+speedup tracks the number of free cores.
+
+Usage: python benchmarks/bench_workers.py [--updates N] [--workers 1,2,4] [--rtt MS]
+"""
+import argparse
+import functools
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_bot import command_update, stub_application_builder
+from utils.workers import Supervisor
+
+FIRST_USER = 1000
+
+def check_routing(supervisor: Supervisor):
+    """A user's updates from a private chat and from groups must reach the same worker,
+    which holds that user's user_data and conversations"""
+    for user_id in range(FIRST_USER, FIRST_USER + 1000):
+        private = supervisor.worker_for(command_update(1, user_id, '/profile'))
+        for group_id in (-1001, -1002 - user_id):
+            group = supervisor.worker_for(command_update(1, user_id, '/profile', group_id=group_id))
+            assert group == private, f"user {user_id}: private chat on worker {private}, group on {group}"
+
+def run(workers: int, updates: int, rtt: float) -> float:
+    supervisor = Supervisor(workers, make_builder=functools.partial(stub_application_builder, rtt))
+    check_routing(supervisor)
+    supervisor.start()
+    start = time.perf_counter()
+    for n in range(updates):
+        supervisor.dispatch(command_update(n + 1, FIRST_USER + n % 1000, '/profile'))
+    supervisor.stop()
+    return updates / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--workers', default=','.join(str(n) for n in (1, 2, 4, 8) if n <= (os.cpu_count() or 1) * 2))
+    parser.add_argument('--rtt', type=float, default=0, help="simulated Bot API round trip in ms")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Inherited by the worker processes
+        os.environ['DB_NAME'] = os.path.join(tmp, "recipes.db")
+        os.environ['MEDIA_ROOT'] = os.path.join(tmp, "media")
+        os.environ['LOG_FILE'] = os.path.join(tmp, "bot.log")
+        # Replies go to the stub; Telegram's 30 messages/s would be the only thing measured
+        os.environ['OUTBOUND_GLOBAL_RATE'] = '1000000'
+        os.environ['OUTBOUND_CHAT_RATE'] = '1000000'
+
+        from database.db_operations import DatabaseManager
+        from database.db_setup import init_db
+        init_db(os.environ['DB_NAME'])
+        db = DatabaseManager(os.environ['DB_NAME'])
+        for n in range(1000):
+            db.register_user(FIRST_USER + n, f"user{n}", f"User {n}")
+
+        print(f"updates: {args.updates}, cores: {os.cpu_count()}, simulated rtt: {args.rtt:g} ms")
+        baseline = None
+        for workers in (int(n) for n in args.workers.split(',')):
+            rate = run(workers, args.updates, args.rtt / 1000)
+            baseline = baseline or rate
+            print(f"{workers} workers: {rate:,.0f} updates/s ({rate / baseline:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Write throughput of concurrent chats: a commit per write vs the group-committing writer.
+
+Each thread plays a chat that registers, saves a BMI, adds favorites and
+saves a recipe, the write mix of a new user.
+
+Usage: python benchmarks/bench_writes.py [--chats N] [--writes N] [--synchronous NORMAL|FULL]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connection_pool
+from database.db_operations import DatabaseManager
+from database.db_setup import init_db
+
+class CommitPerWriteManager(DatabaseManager):
+    """The pre-writer behaviour: every write commits on the calling thread's connection."""
+
+    def _write(self, op):
+        conn = self._get_connection()
+        try:
+            result = op(conn.cursor())
+            conn.commit()
+            return result
+        finally:
+            self._release_connection(conn)
+
+RECIPE = {
+    'title': "قورمه سبزی",
+    'ingredients': "سبزی، لوبیا، گوشت",
+    'cooking_time': 120,
+    'skill_level': 'متوسط',
+    'calories': 450,
+    'instructions': "همه مواد را با هم بپزید.",
+}
+
+def run(db: DatabaseManager, chats: int, writes: int, first_id: int) -> tuple:
+    failures = []
+
+    def chat(telegram_id):
+        failed = 0
+        for i in range(writes // 4):
+            failed += not db.register_user(telegram_id, f"user{telegram_id}", "کاربر")
+            failed += not db.save_user_bmi(telegram_id, 20 + i % 10)
+            failed += not db.add_to_favorites(telegram_id, i % 50 + 1)
+            failed += db.save_recipe(RECIPE, telegram_id) is None
+        failures.append(failed)
+
+    threads = [threading.Thread(target=chat, args=(first_id + n,)) for n in range(chats)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return (chats * (writes // 4) * 4) / elapsed, sum(failures)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chats', type=int, default=32, help="concurrent writing threads")
+    parser.add_argument('--writes', type=int, default=200, help="writes per chat")
+    parser.add_argument('--synchronous', default=connection_pool.PRAGMAS['synchronous'],
+                        help="SQLite synchronous mode; FULL fsyncs every commit")
+    args = parser.parse_args()
+    connection_pool.PRAGMAS['synchronous'] = args.synchronous
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "recipes.db")
+        init_db(db_path)
+
+        before, before_failed = run(CommitPerWriteManager(db_path), args.chats, args.writes, 1)
+        db = DatabaseManager(db_path)
+        after, after_failed = run(db, args.chats, args.writes, 1 + args.chats)
+        stats = db._writer.stats()
+        db._writer.close()
+
+    print(f"chats: {args.chats}, writes: {args.chats * args.writes}, synchronous: {args.synchronous}")
+    print(f"commit per write: {before:,.0f} writes/s, {before_failed} failed")
+    print(f"group commit:     {after:,.0f} writes/s, {after_failed} failed, "
+          f"{stats['writes_per_batch']} writes per commit")
+    print(f"speedup:          {after / before:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Synthetic Persian recipe data for benchmarks."""
+import random
+import sqlite3
+from database.db_operations import DatabaseManager
+
+DISHES = [
+    "قورمه سبزی", "قیمه", "فسنجان", "کشک بادمجان", "میرزا قاسمی", "زرشک پلو",
+    "باقالی پلو", "آش رشته", "عدس پلو", "کوفته تبریزی", "دلمه برگ مو", "کباب کوبیده",
+    "جوجه کباب", "شیرین پلو", "ته چین", "خورش بامیه", "کله جوش", "دیزی", "کوکو سبزی",
+    "شله زرد", "حلیم", "ماکارونی", "سالاد شیرازی", "خورش کرفس", "لوبیا پلو",
+]
+INGREDIENTS = [
+    "برنج", "گوشت گوسفندی", "مرغ", "پیاز", "سیر", "زردچوبه", "زعفران", "لوبیا قرمز",
+    "سبزی قورمه", "لیمو عمانی", "گردو", "رب انار", "بادمجان", "کشک", "گوجه فرنگی",
+    "لپه", "سیب زمینی", "نخود", "عدس", "کشمش", "زرشک", "باقالی", "شوید", "تخم مرغ",
+    "روغن", "نمک", "فلفل سیاه", "دارچین", "ماست", "نعناع خشک",
+]
+STEPS = [
+    "پیاز را خلال کرده و در روغن سرخ کنید.",
+    "گوشت را اضافه کرده و تفت دهید.",
+    "ادویه ها را اضافه کنید و هم بزنید.",
+    "آب کافی بریزید و اجازه دهید با حرارت ملایم بپزد.",
+    "برنج را خیس کرده و آبکش کنید.",
+    "زعفران دم کرده را روی غذا بریزید.",
+    "در پایان نمک و فلفل را تنظیم کنید.",
+    "حدود یک ساعت روی حرارت ملایم دم بگذارید.",
+]
+LEVELS = ["🟢 مبتدی", "🟡 متوسط", "🔴 حرفه‌ای"]
+
+def recipe_row(rng: random.Random, n: int, owner_id: int) -> tuple:
+    title = f"{rng.choice(DISHES)} {rng.choice(['خانگی', 'مجلسی', 'سنتی', 'ساده', 'ویژه'])} {n}"
+    ingredients = "، ".join(rng.sample(INGREDIENTS, rng.randint(4, 9)))
+    instructions = " ".join(rng.sample(STEPS, rng.randint(3, 6)))
+    return (
+        title, ingredients, rng.randint(10, 240), rng.choice(LEVELS),
+        rng.randint(150, 1200), instructions, owner_id,
+    )
+
+def generate_users(conn: sqlite3.Connection, count: int, first_id: int = 1):
+    """Register `count` active users with consecutive Telegram ids."""
+    conn.executemany("""
+        INSERT INTO users (telegram_id, username, full_name, is_active) VALUES (?, ?, ?, TRUE)
+    """, [(user_id, f"user{user_id}", f"User {user_id}") for user_id in range(first_id, first_id + count)])
+    conn.commit()
+
+def generate_recipes(conn: sqlite3.Connection, count: int, owners: int = 1000, seed: int = 42, first: int = 0):
+    """Insert `count` random recipes spread over `owners` users, numbered in their titles from `first`."""
+    rng = random.Random(seed)
+    batch = []
+    for n in range(first, first + count):
+        batch.append(recipe_row(rng, n, rng.randint(1, owners)))
+        if len(batch) == 10000:
+            _insert_recipes(conn, batch)
+            batch = []
+    if batch:
+        _insert_recipes(conn, batch)
+    conn.commit()
+
+def generate_favorites(conn: sqlite3.Connection, count: int, users: int, recipes: int, seed: int = 42):
+    """Insert about `count` favorites of random users (ids 1..users) on random recipes (ids 1..recipes)."""
+    rng = random.Random(seed)
+    for start in range(0, count, 10000):
+        conn.executemany("""
+            INSERT OR IGNORE INTO favorites (user_id, recipe_id) VALUES (?, ?)
+        """, [(rng.randint(1, users), rng.randint(1, recipes)) for _ in range(min(10000, count - start))])
+    conn.commit()
+
+def _insert_recipes(conn: sqlite3.Connection, rows: list):
+    conn.executemany("""
+        INSERT INTO recipes (
+            title, ingredients, cooking_time, skill_level, calories,
+            instructions, created_at, updated_at, owner_id,
+            search_title, search_ingredients, search_instructions
+        )
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'), ?, ?, ?, ?)
+    """, [
+        # Filled as save_recipe() does, so the FTS index sees what it would in production
+        (*row, *DatabaseManager._search_columns(
+            {'title': row[0], 'ingredients': row[1], 'instructions': row[5]}
+        ))
+        for row in rows
+    ])
@@ -0,0 +1,135 @@
+"""In-process stand-in for the Telegram Bot API, for benchmarks that run the whole bot.
+
+StubTelegram holds the "server" side: updates waiting for getUpdates, the
+time each chat got a reply and a count of the calls made per API method. StubRequest plugs it into python-telegram-bot as
+the HTTP layer:
+
+    telegram = StubTelegram(rtt=0.05)
+    builder = (ApplicationBuilder().token(STUB_TOKEN)
+               .request(StubRequest(telegram)).get_updates_request(StubRequest(telegram)))
+"""
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+from telegram.ext import ApplicationBuilder
+from telegram.request import BaseRequest, RequestData
+
+STUB_TOKEN = '123456:stub'
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot'}
+
+def command_update(update_id: int, user_id: int, text: str, group_id: Optional[int] = None) -> dict:
+    """A message update, as Telegram would send it; in a private chat unless group_id is given"""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"}
+    chat = ({'id': group_id, 'type': 'group', 'title': f"group{group_id}"} if group_id is not None
+            else {'id': user_id, 'type': 'private', 'first_name': user['first_name']})
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': chat,
+        'from': user,
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+def callback_update(update_id: int, user_id: int, data: str) -> dict:
+    """An inline button press on a message the bot sent to a private chat"""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"}
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private', 'first_name': user['first_name']},
+        'from': BOT_USER,
+        'text': '...',
+    }
+    return {
+        'update_id': update_id,
+        'callback_query': {'id': str(update_id), 'from': user, 'chat_instance': str(user_id),
+                           'data': data, 'message': message},
+    }
+
+class StubTelegram:
+    """The API server: every call takes `rtt` seconds, split evenly between its two legs"""
+
+    def __init__(self, rtt: float = 0.0):
+        self.rtt = rtt
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self.replies: Dict[int, List[float]] = {}
+        self.calls: Dict[str, int] = {}
+        self._message_id = 0
+
+    def push_update(self, update: dict):
+        """Make an update available to getUpdates"""
+        self.updates.put_nowait(update)
+
+    async def get_updates(self, params: dict) -> list:
+        await asyncio.sleep(self.rtt / 2)
+        updates = []
+        try:
+            # Long polling: wait for the first update, then take whatever else is there
+            updates.append(await asyncio.wait_for(self.updates.get(), params.get('timeout') or 0.001))
+            while not self.updates.empty() and len(updates) < (params.get('limit') or 100):
+                updates.append(self.updates.get_nowait())
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(self.rtt / 2)
+        return updates
+
+    async def call(self, method: str, params: dict):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        await asyncio.sleep(self.rtt / 2)
+        if method == 'getMe':
+            result = BOT_USER
+        elif method in ('sendMessage', 'sendPhoto', 'sendVoice'):
+            chat_id = int(params['chat_id'])
+            self.replies.setdefault(chat_id, []).append(time.perf_counter())
+            self._message_id += 1
+            result = {
+                'message_id': self._message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', ''),
+            }
+        else:
+            result = True
+        await asyncio.sleep(self.rtt / 2)
+        return result
+
+class StubRequest(BaseRequest):
+    """python-telegram-bot HTTP backend that answers from a StubTelegram"""
+
+    def __init__(self, telegram: StubTelegram):
+        self.telegram = telegram
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if api_method == 'getUpdates':
+            result = await self.telegram.get_updates(params)
+        else:
+            result = await self.telegram.call(api_method, params)
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+def stub_application_builder(rtt: float = 0.0) -> ApplicationBuilder:
+    """An ApplicationBuilder talking to a fresh StubTelegram; picklable as a worker's make_builder"""
+    telegram = StubTelegram(rtt)
+    return (
+        ApplicationBuilder().token(STUB_TOKEN)
+        .request(StubRequest(telegram))
+        .get_updates_request(StubRequest(telegram))
+    )
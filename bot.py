@@ -1,11 +1,27 @@
-from telegram.ext import (ApplicationBuilder, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler)
+from telegram.ext import (Application, ApplicationBuilder, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler, InlineQueryHandler)
 import handlers.recipe_handler as recipe_handler
 from handlers.bmi_handler import *
 from handlers.search_handler import *
 from database.db_setup import init_db
 from utils.common import cancel
 from handlers.auth_handler import start_registration, register_username, ban_user_command, require_auth, REGISTER_USERNAME, show_profile, BAN_REASON, receive_ban_reason, cancel_ban
-from handlers.recipe_handler import view_recipe_media
+from handlers.recipe_handler import view_recipe_media, media_pipeline
+from handlers.favorite_handler import toggle_favorite, view_favorites
+from handlers.stats_handler import show_stats
+from utils.loop_monitor import loop_monitor
+from utils.metrics import instrument_application, metrics, metrics_server
+from utils.logs import setup_logging
+from utils.pager import handle_page_callback
+from database.db_operations import DB_NAME, favorite_ids_cache, user_identity_cache
+from database.writer import get_writer
+from database.persistence import SQLitePersistence
+from utils.outbound import outbound_scheduler
+from utils import image_previews
+from utils.render_cache import render_cache
+from utils.webhook import WEBHOOK_SECRET, WEBHOOK_URL, WebhookServer, serve_webhook
+from utils.workers import BOT_WORKERS, run_supervisor
+import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -14,12 +30,55 @@ load_dotenv()
 
 # Get bot token from environment variable
 BOT_TOKEN = os.getenv('BOT_TOKEN')
-if not BOT_TOKEN:
-    raise ValueError("No BOT_TOKEN found in environment variables")
 
-def main():
-    init_db()
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+# 'polling' (getUpdates) or 'webhook' (see utils/webhook.py)
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+
+logger = logging.getLogger(__name__)
+
+async def on_startup(app):
+    # Report whenever a handler blocks the event loop
+    loop_monitor.start()
+    writer = get_writer(DB_NAME)
+    metrics.gauge_stats('bot_loop_lag', loop_monitor.snapshot, "Event loop lag monitor")
+    metrics.gauge_stats('bot_outbound', outbound_scheduler.snapshot, "Outbound scheduler state")
+    metrics.gauge_stats('db_writer', writer.stats, "Group-commit writer batches")
+    for name, cache in (('user_identity', user_identity_cache), ('favorite_ids', favorite_ids_cache),
+                        ('render', render_cache)):
+        metrics.gauge_stats(f'cache_{name}', cache.stats, f"{name} cache")
+    await metrics_server.start()
+
+async def on_stop(app):
+    # Before Application.shutdown() closes the bot's HTTP client: pending
+    # attachments still download their files from Telegram
+    await media_pipeline.drain()
+    image_previews.shutdown()
+
+async def on_shutdown(app):
+    await metrics_server.stop()
+    await loop_monitor.stop()
+    logger.info("Event loop lag", extra={'stats': loop_monitor.snapshot()})
+    logger.info("User cache", extra={'stats': user_identity_cache.stats()})
+    logger.info("Render cache", extra={'stats': render_cache.stats()})
+    logger.info("Outbound", extra={'stats': outbound_scheduler.snapshot()})
+    # Last: everything above may still have queued writes
+    writer = get_writer(DB_NAME)
+    writer.close()
+    logger.info("DB writer", extra={'stats': writer.stats()})
+
+def build_application(builder: ApplicationBuilder = None) -> Application:
+    """The bot with all handlers registered; pass a builder to override its token or requests"""
+    if builder is None:
+        builder = ApplicationBuilder().token(BOT_TOKEN)
+    app = (
+        builder
+        .rate_limiter(outbound_scheduler)
+        .persistence(SQLitePersistence())
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     
     # Recipe edit conversation handler
     edit_recipe_handler = ConversationHandler(
@@ -62,7 +121,7 @@ def main():
             CallbackQueryHandler(recipe_handler.handle_remove_media, pattern="^edit_[0-9]+_remove_")
         ],
         name="recipe_edit",
-        persistent=False,
+        persistent=True,
         per_message=False,
         per_chat=True,
         allow_reentry=True
@@ -72,6 +131,11 @@ def main():
     app.add_handler(edit_recipe_handler)
     app.add_handler(CommandHandler("my_recipes", recipe_handler.show_my_recipes))
     app.add_handler(CallbackQueryHandler(recipe_handler.view_recipe_details, pattern="^view_recipe_"))
+    app.add_handler(CallbackQueryHandler(handle_page_callback, pattern="^page_(next|prev)$"))
+    app.add_handler(CommandHandler("my_favorites", view_favorites))
+    app.add_handler(CallbackQueryHandler(toggle_favorite, pattern="^favorite_[0-9]+"))
+    app.add_handler(InlineQueryHandler(recipe_handler.inline_query))
+    app.add_handler(CallbackQueryHandler(view_recipe_media, pattern="^view_media_[0-9]+$"))
     
     # Registration conversation handler
     registration_handler = ConversationHandler(
@@ -79,7 +143,9 @@ def main():
         states={
             REGISTER_USERNAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, register_username)],
         },
-        fallbacks=[CommandHandler('cancel', cancel)]
+        fallbacks=[CommandHandler('cancel', cancel)],
+        name="registration",
+        persistent=True
     )
     
     app.add_handler(registration_handler)
@@ -100,7 +166,9 @@ def main():
             recipe_handler.INSTRUCTIONS_VOICE_RECORD: [MessageHandler(filters.VOICE & ~filters.COMMAND, require_auth(recipe_handler.receive_instructions_voice_record))],
             recipe_handler.PHOTO: [MessageHandler(filters.PHOTO | filters.COMMAND, require_auth(recipe_handler.receive_photo))],
         },
-        fallbacks=[CommandHandler('cancel', cancel)]
+        fallbacks=[CommandHandler('cancel', cancel)],
+        name="add_recipe",
+        persistent=True
     )
     
     # BMI calculation conversation handler
@@ -110,7 +178,9 @@ def main():
             BMI_HEIGHT: [MessageHandler(filters.TEXT & ~filters.COMMAND, require_auth(receive_bmi_height))],
             BMI_WEIGHT: [MessageHandler(filters.TEXT & ~filters.COMMAND, require_auth(receive_bmi_weight))],
         },
-        fallbacks=[CommandHandler('cancel', cancel)]
+        fallbacks=[CommandHandler('cancel', cancel)],
+        name="bmi",
+        persistent=True
     )
     
     # Search conversation handler
@@ -123,7 +193,7 @@ def main():
         },
         fallbacks=[CommandHandler('cancel', cancel)],
         name="search_recipes",
-        persistent=False
+        persistent=True
     )
     
     app.add_handler(recipe_conv_handler)
@@ -138,10 +208,13 @@ def main():
                 MessageHandler(filters.TEXT & ~filters.COMMAND, receive_ban_reason)
             ]
         },
-        fallbacks=[CommandHandler('cancel', cancel_ban)]
+        fallbacks=[CommandHandler('cancel', cancel_ban)],
+        name="ban",
+        persistent=True
     )
     
     app.add_handler(ban_conv_handler)
+    app.add_handler(CommandHandler("stats", show_stats))
     
     # # Debug middleware - moved to the end and modified filter
     # class DebugMiddleware:
@@ -160,8 +233,32 @@ def main():
     #     DebugMiddleware()
     # ))
     
-    print("Bot is running...")
-    app.run_polling()
+    # Latency histograms per handler, served with the rest of utils/metrics
+    instrument_application(app)
+    return app
+
+def main():
+    if not BOT_TOKEN:
+        raise ValueError("No BOT_TOKEN found in environment variables")
+    if BOT_MODE not in ('polling', 'webhook'):
+        raise ValueError(f"Unknown BOT_MODE: {BOT_MODE}")
+    setup_logging()
+    init_db()
+
+    if BOT_WORKERS > 1:
+        logger.info("Bot is running (%s, %s workers)...", BOT_MODE, BOT_WORKERS)
+        asyncio.run(run_supervisor(
+            BOT_TOKEN, BOT_WORKERS, webhook=BOT_MODE == 'webhook',
+            secret_token=WEBHOOK_SECRET, webhook_url=WEBHOOK_URL
+        ))
+        return
+
+    app = build_application()
+    logger.info("Bot is running (%s)...", BOT_MODE)
+    if BOT_MODE == 'webhook':
+        asyncio.run(serve_webhook(app, WebhookServer(app, WEBHOOK_SECRET)))
+    else:
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,75 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from database.db_operations import DB_NAME, DatabaseManager, favorite_ids_cache, user_identity_cache
+
+# One bounded executor shared by every AsyncDatabaseManager, so the number of
+# threads (and pooled connections) touching SQLite stays fixed.
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', '4'))
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix='db')
+
+class AsyncDatabaseManager:
+    """Awaitable counterpart of DatabaseManager.
+
+    Every public DatabaseManager method is exposed under the same name as a
+    coroutine that runs the query on the shared DB executor, so handlers
+    never block the event loop on SQLite.
+    """
+
+    def __init__(self, db_name: str = DB_NAME):
+        self.sync = DatabaseManager(db_name)
+
+    def __getattr__(self, name):
+        method = getattr(self.sync, name)
+        if name.startswith('_') or not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self._run(method, *args, **kwargs)
+
+        # Cache the wrapper so later lookups skip __getattr__.
+        setattr(self, name, call)
+        return call
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(method, *args, **kwargs))
+
+    # User identity is answered straight from the cache on a hit, without an
+    # executor round trip; require_auth runs on every update.
+    async def get_user_identity(self, telegram_id: int) -> dict:
+        identity = user_identity_cache.get(telegram_id)
+        if identity is None:
+            # Not cached if a registration or ban invalidated it during the load
+            generation = user_identity_cache.generation()
+            identity = await self._run(self.sync._load_user_identity, telegram_id)
+            user_identity_cache.set(telegram_id, identity, generation)
+        return identity
+
+    async def is_user_registered(self, telegram_id: int) -> bool:
+        return (await self.get_user_identity(telegram_id))['is_active']
+
+    async def get_user_profile(self, telegram_id: int) -> Optional[dict]:
+        identity = await self.get_user_identity(telegram_id)
+        if not identity['exists']:
+            return None
+        return {key: identity[key] for key in ('username', 'full_name', 'is_active', 'joined_date')}
+
+    async def get_favorite_ids(self, telegram_id: int) -> frozenset:
+        favorite_ids = favorite_ids_cache.get(telegram_id)
+        if favorite_ids is None:
+            # Not cached if a favorite was added or removed during the load
+            generation = favorite_ids_cache.generation()
+            favorite_ids = await self._run(self.sync._load_favorite_ids, telegram_id)
+            favorite_ids_cache.set(telegram_id, favorite_ids, generation)
+        return favorite_ids
+
+    async def is_favorite(self, telegram_id: int, recipe_id: int) -> bool:
+        return recipe_id in await self.get_favorite_ids(telegram_id)
+
+    def is_super_admin(self, telegram_id: int) -> bool:
+        # Pure comparison, no query: not worth an executor round trip.
+        return self.sync.is_super_admin(telegram_id)
@@ -0,0 +1,63 @@
+import sqlite3
+import threading
+from typing import Dict
+
+# Applied once to every connection the pool opens.
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,       # ~16 MB page cache per connection
+    'mmap_size': 268435456,     # 256 MB memory-mapped reads
+    'busy_timeout': 5000,       # wait up to 5s on a locked database
+    'temp_store': 'MEMORY',
+}
+
+class ConnectionPool:
+    """Keeps one long-lived SQLite connection per thread."""
+
+    def __init__(self, db_name: str, pragmas: dict = None):
+        self.db_name = db_name
+        self.pragmas = PRAGMAS if pragmas is None else pragmas
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        # Connections stay open for reuse; just make sure no half-finished
+        # transaction leaks into the next query on this thread.
+        if conn.in_transaction:
+            conn.rollback()
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_name: str) -> ConnectionPool:
+    """Return the shared pool for a database file, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(db_name)
+        if pool is None:
+            pool = ConnectionPool(db_name)
+            _pools[db_name] = pool
+        return pool
@@ -1,29 +1,100 @@
+import json
 import sqlite3
 import os
+import logging
 from typing import List, Tuple, Optional
 from dotenv import load_dotenv
+from database.connection_pool import get_pool
+from database.media_store import MediaStore
+from database.writer import get_writer
+from utils.text_normalizer import normalize_text
+from utils.cache import TTLCache
+from utils.metrics import timed_methods
+from utils.render_cache import render_cache
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+DB_NAME = os.getenv('DB_NAME', 'recipes.db')
+
+# Registered/banned state and profile per telegram_id, shared by every
+# DatabaseManager. Writes to users invalidate the affected entry.
+user_identity_cache = TTLCache(
+    maxsize=int(os.getenv('USER_CACHE_SIZE', '10000')),
+    ttl=float(os.getenv('USER_CACHE_TTL', '300')),
+    name='user_identity'
+)
+
+# Favorite recipe ids per telegram_id, so a page of recipes can be marked
+# without a query per recipe.
+favorite_ids_cache = TTLCache(maxsize=10000, ttl=600, name='favorite_ids')
+
+# Matches a search keeps for paging; later pages come from this ranked list
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', '200'))
+
+# Columns of the recipe dict returned by get_recipe_details and patch_recipe
+RECIPE_COLUMNS = (
+    'id', 'title', 'ingredients', 'cooking_time', 'skill_level', 'calories',
+    'instructions', 'instruction_voice', 'image_path', 'created_at', 'owner_id',
+    'image_file_id', 'voice_file_id', 'updated_at',
+)
+
+# Columns patch_recipe may set, with the normalized search column each one feeds
+PATCHABLE_COLUMNS = {
+    'title': 'search_title',
+    'ingredients': 'search_ingredients',
+    'instructions': 'search_instructions',
+    'cooking_time': None,
+    'skill_level': None,
+    'calories': None,
+}
+
+# (stored path column, Telegram file_id column) per media kind
+MEDIA_COLUMNS = {
+    'photo': ('image_path', 'image_file_id'),
+    'voice': ('instruction_voice', 'voice_file_id'),
+}
+
+@timed_methods('db_query_seconds')
 class DatabaseManager:
-    def __init__(self, db_name: str = "recipes.db"):
+    def __init__(self, db_name: str = DB_NAME):
         self.db_name = db_name
         self.SUPER_ADMIN_ID = int(os.getenv('SUPER_ADMIN_ID', '1'))
+        self._pool = get_pool(db_name)
+        self._writer = get_writer(db_name)
+        self.media = MediaStore(db_name)
 
-    def _get_connection(self):
-        return sqlite3.connect(self.db_name)
+    def _get_connection(self) -> sqlite3.Connection:
+        return self._pool.acquire()
 
-    def save_recipe(self, recipe_data: dict, owner_id: int) -> bool:
-        try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+    def _release_connection(self, conn: sqlite3.Connection):
+        self._pool.release(conn)
+
+    def _write(self, op):
+        """Run op(cursor) on the writer thread and return its result once committed"""
+        return self._writer.execute(op)
+
+    @staticmethod
+    def _search_columns(recipe_data: dict) -> Tuple[str, str, str]:
+        """Normalized copies of the searchable text, stored next to the originals"""
+        return (
+            normalize_text(recipe_data['title']),
+            normalize_text(recipe_data['ingredients']),
+            normalize_text(recipe_data['instructions'])
+        )
+
+    def save_recipe(self, recipe_data: dict, owner_id: int) -> Optional[int]:
+        """Insert a recipe and return its id, or None on failure"""
+        def op(cursor):
             cursor.execute("""
                 INSERT INTO recipes (
                     title, ingredients, cooking_time, skill_level, calories, 
                     instructions, instruction_voice, image_path, created_at, updated_at,
-                    owner_id
+                    owner_id, image_file_id, voice_file_id,
+                    search_title, search_ingredients, search_instructions
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'), ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'), ?, ?, ?, ?, ?, ?)
             """, (
                 recipe_data['title'],
                 recipe_data['ingredients'],
@@ -33,53 +104,89 @@ class DatabaseManager:
                 recipe_data['instructions'],
                 recipe_data.get('instruction_voice'),
                 recipe_data.get('image_path'),
-                owner_id
+                owner_id,
+                recipe_data.get('image_file_id'),
+                recipe_data.get('voice_file_id'),
+                *self._search_columns(recipe_data)
             ))
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error saving recipe: {e}")
-            return False
+            return cursor.lastrowid
+
+        try:
+            return self._write(op)
+        except Exception:
+            logger.exception("Error saving recipe")
+            return None
+
+    @staticmethod
+    def _fts_query(search_term: str) -> str:
+        """Build an FTS5 prefix query that matches every word of the search term"""
+        terms = [term.replace('"', '""') for term in normalize_text(search_term).split()]
+        return ' '.join(f'"{term}"*' for term in terms if term)
+
+    def search_recipe_ids(self, search_term: str, limit: int = SEARCH_MAX_RESULTS) -> List[int]:
+        """Ids of the best matches, best first.
+
+        bm25 scores shift with every recipe written, so they make no stable
+        page cursor; a search is ranked once and paged through this list.
+        """
+        match = self._fts_query(search_term)
+        if not match:
+            return []
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT rowid FROM recipes_fts
+                WHERE recipes_fts MATCH ?
+                ORDER BY bm25(recipes_fts), rowid
+                LIMIT ?
+            """, (match, limit))
+            return [row[0] for row in cursor.fetchall()]
         finally:
-            conn.close()
+            self._release_connection(conn)
+
+    def get_search_results(self, recipe_ids: List[int]) -> List[Tuple]:
+        """Search result rows of these recipes in the given order, with each one's position in it.
 
-    def search_recipes(self, search_term: str) -> List[Tuple]:
+        Recipes deleted since the search was ranked are left out.
+        """
+        if not recipe_ids:
+            return []
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT r.id, r.title, r.ingredients, r.cooking_time, r.skill_level, 
-                       r.calories, r.image_path, r.owner_id, u.username
-                FROM recipes r
+                       r.calories, r.image_path, r.owner_id, u.username,
+                       r.image_file_id, ranked.key AS position,
+                       r.image_preview_path, r.image_preview_file_id, r.updated_at
+                FROM json_each(?) ranked
+                JOIN recipes r ON r.id = ranked.value
                 LEFT JOIN users u ON r.owner_id = u.telegram_id
-                WHERE LOWER(r.title) LIKE ? 
-                   OR LOWER(r.ingredients) LIKE ?
-                   OR LOWER(r.instructions) LIKE ?
-                ORDER BY r.created_at DESC
-            """, (
-                f'%{search_term.lower()}%',
-                f'%{search_term.lower()}%',
-                f'%{search_term.lower()}%'
-            ))
+                ORDER BY ranked.key
+            """, (json.dumps(recipe_ids),))
             return cursor.fetchall()
         finally:
-            conn.close()
+            self._release_connection(conn)
+
+    def search_recipes(self, search_term: str, limit: int = 50) -> List[Tuple]:
+        """The best `limit` matches, best first"""
+        return self.get_search_results(self.search_recipe_ids(search_term, limit))
 
     def save_user_bmi(self, telegram_id: int, bmi: float) -> bool:
-        try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+        def op(cursor):
             cursor.execute("""
                 INSERT OR REPLACE INTO users (telegram_id, bmi)
                 VALUES (?, ?)
             """, (telegram_id, bmi))
-            conn.commit()
+
+        try:
+            self._write(op)
+            user_identity_cache.invalidate(telegram_id)
             return True
-        except Exception as e:
-            print(f"Error saving BMI: {e}")
+        except Exception:
+            logger.exception("Error saving BMI")
             return False
-        finally:
-            conn.close()
 
     def get_user_bmi(self, telegram_id: int) -> Optional[float]:
         try:
@@ -89,42 +196,63 @@ class DatabaseManager:
             result = cursor.fetchone()
             return result[0] if result else None
         finally:
-            conn.close()
+            self._release_connection(conn)
 
     def register_user(self, telegram_id: int, username: str, full_name: str) -> bool:
-        try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+        def op(cursor):
             cursor.execute("""
                 INSERT OR IGNORE INTO users (telegram_id, username, full_name, is_active)
                 VALUES (?, ?, ?, TRUE)
             """, (telegram_id, username, full_name))
-            conn.commit()
+
+        try:
+            self._write(op)
+            user_identity_cache.invalidate(telegram_id)
             return True
-        except Exception as e:
-            print(f"Error registering user: {e}")
+        except Exception:
+            logger.exception("Error registering user")
             return False
-        finally:
-            conn.close()
 
-    def is_user_registered(self, telegram_id: int) -> bool:
+    def _load_user_identity(self, telegram_id: int) -> dict:
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-            cursor.execute("SELECT is_active FROM users WHERE telegram_id = ?", (telegram_id,))
+            cursor.execute("""
+                SELECT username, full_name, is_active, created_at
+                FROM users 
+                WHERE telegram_id = ?
+            """, (telegram_id,))
             result = cursor.fetchone()
-            return bool(result and result[0])
+            
+            if result:
+                return {
+                    'exists': True,
+                    'username': result[0],
+                    'full_name': result[1],
+                    'is_active': bool(result[2]),
+                    'joined_date': result[3]
+                }
+            return {'exists': False, 'is_active': False}
         finally:
-            conn.close()
+            self._release_connection(conn)
+
+    def get_user_identity(self, telegram_id: int) -> dict:
+        """Registration state and profile of a user, served from user_identity_cache when possible"""
+        identity = user_identity_cache.get(telegram_id)
+        if identity is None:
+            generation = user_identity_cache.generation()
+            identity = self._load_user_identity(telegram_id)
+            user_identity_cache.set(telegram_id, identity, generation)
+        return identity
+
+    def is_user_registered(self, telegram_id: int) -> bool:
+        return self.get_user_identity(telegram_id)['is_active']
 
     def is_super_admin(self, telegram_id: int) -> bool:
         return telegram_id == self.SUPER_ADMIN_ID
 
     def ban_user(self, telegram_id: int, reason: str = None) -> bool:
-        try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            
+        def op(cursor):
             # Update user status and add ban reason
             cursor.execute("""
                 UPDATE users 
@@ -133,116 +261,352 @@ class DatabaseManager:
                     banned_at = datetime('now')
                 WHERE telegram_id = ?
             """, (reason, telegram_id))
-            
-            conn.commit()
             return cursor.rowcount > 0
-        except Exception as e:
-            print(f"Error banning user: {e}")
+
+        try:
+            banned = self._write(op)
+            user_identity_cache.invalidate(telegram_id)
+            return banned
+        except Exception:
+            logger.exception("Error banning user")
             return False
-        finally:
-            conn.close()
 
     def get_user_profile(self, telegram_id: int) -> Optional[dict]:
+        identity = self.get_user_identity(telegram_id)
+        if not identity['exists']:
+            return None
+        return {
+            'username': identity['username'],
+            'full_name': identity['full_name'],
+            'is_active': identity['is_active'],
+            'joined_date': identity['joined_date']
+        }
+
+    def get_user_recipes(self, telegram_id: int, limit: Optional[int] = None,
+                         after: Optional[Tuple[str, int]] = None) -> List[Tuple]:
+        """Newest first; pass the (created_at, id) of the last row as `after` for the next page"""
+        keyset = "AND (created_at, id) < (?, ?)" if after else ""
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT username, full_name, is_active, created_at
-                FROM users 
-                WHERE telegram_id = ?
-            """, (telegram_id,))
-            result = cursor.fetchone()
-            
-            if result:
-                return {
-                    'username': result[0],
-                    'full_name': result[1],
-                    'is_active': bool(result[2]),
-                    'joined_date': result[3]
-                }
-            return None
+            cursor.execute(f"""
+                SELECT id, title, cooking_time, skill_level, calories, created_at, updated_at
+                FROM recipes
+                WHERE owner_id = ? {keyset}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            """, (telegram_id, *(after or ()), -1 if limit is None else limit))
+            return cursor.fetchall()
         finally:
-            conn.close() 
+            self._release_connection(conn)
+
+    def get_latest_recipes(self, search_term: str = '', limit: int = 20,
+                           after_id: Optional[int] = None) -> List[Tuple]:
+        """Newest recipes of all users, optionally only those matching `search_term`.
 
-    def get_user_recipes(self, telegram_id: int) -> List[Tuple]:
+        Pages by id (pass the last row's id as `after_id`) instead of ranking,
+        so a broad prefix like a single letter costs no more than a narrow one.
+        """
+        # Ids are below this bound for the first page
+        before_id = after_id if after_id is not None else 2 ** 63 - 1
+        columns = """
+            r.id, r.title, r.ingredients, r.cooking_time, r.skill_level,
+            r.calories, r.image_path, r.owner_id, u.username, r.image_file_id,
+            r.updated_at
+        """
+        if search_term:
+            match = self._fts_query(search_term)
+            if not match:
+                return []
+            # FTS5 walks its rowids in descending order and stops at LIMIT
+            sql = f"""
+                SELECT {columns}
+                FROM recipes_fts f
+                JOIN recipes r ON r.id = f.rowid
+                LEFT JOIN users u ON r.owner_id = u.telegram_id
+                WHERE recipes_fts MATCH ? AND f.rowid < ?
+                ORDER BY f.rowid DESC
+                LIMIT ?
+            """
+            params = (match, before_id, limit)
+        else:
+            sql = f"""
+                SELECT {columns}
+                FROM recipes r
+                LEFT JOIN users u ON r.owner_id = u.telegram_id
+                WHERE r.id < ?
+                ORDER BY r.id DESC
+                LIMIT ?
+            """
+            params = (before_id, limit)
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, title, cooking_time, skill_level, calories, created_at
-                FROM recipes
-                WHERE owner_id = ?
-                ORDER BY created_at DESC
-            """, (telegram_id,))
+            cursor.execute(sql, params)
             return cursor.fetchall()
         finally:
-            conn.close() 
+            self._release_connection(conn)
 
-    def get_recipe_details(self, recipe_id: int) -> Optional[dict]:
+    def get_user_favorites(self, telegram_id: int, limit: Optional[int] = None,
+                           after: Optional[Tuple[str, int]] = None) -> List[Tuple]:
+        """Favorite recipes newest first, paged like get_user_recipes"""
+        keyset = "AND (r.created_at, r.id) < (?, ?)" if after else ""
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT r.id, r.title, r.ingredients, r.cooking_time, r.skill_level,
+                       r.calories, r.image_path, u.username, r.created_at,
+                       r.image_file_id, r.updated_at
+                FROM favorites f
+                JOIN recipes r ON r.id = f.recipe_id
+                LEFT JOIN users u ON r.owner_id = u.telegram_id
+                WHERE f.user_id = ? {keyset}
+                ORDER BY r.created_at DESC, r.id DESC
+                LIMIT ?
+            """, (telegram_id, *(after or ()), -1 if limit is None else limit))
+            return cursor.fetchall()
+        finally:
+            self._release_connection(conn)
+
+    def add_to_favorites(self, telegram_id: int, recipe_id: int) -> bool:
+        """Idempotent: adding an existing favorite is a no-op"""
+        def op(cursor):
+            cursor.execute("""
+                INSERT INTO favorites (user_id, recipe_id)
+                VALUES (?, ?)
+                ON CONFLICT (user_id, recipe_id) DO NOTHING
+            """, (telegram_id, recipe_id))
+
+        try:
+            self._write(op)
+            favorite_ids_cache.invalidate(telegram_id)
+            return True
+        except Exception:
+            logger.exception("Error adding favorite")
+            return False
+
+    def remove_from_favorites(self, telegram_id: int, recipe_id: int) -> bool:
+        """Idempotent: removing a missing favorite is a no-op"""
+        def op(cursor):
             cursor.execute("""
-                SELECT title, ingredients, cooking_time, skill_level, calories, 
-                       instructions, instruction_voice, image_path, created_at, owner_id
+                DELETE FROM favorites
+                WHERE user_id = ? AND recipe_id = ?
+            """, (telegram_id, recipe_id))
+
+        try:
+            self._write(op)
+            favorite_ids_cache.invalidate(telegram_id)
+            return True
+        except Exception:
+            logger.exception("Error removing favorite")
+            return False
+
+    def set_favorite(self, telegram_id: int, recipe_id: int, favorite: bool) -> bool:
+        if favorite:
+            return self.add_to_favorites(telegram_id, recipe_id)
+        return self.remove_from_favorites(telegram_id, recipe_id)
+
+    def _load_favorite_ids(self, telegram_id: int) -> frozenset:
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT recipe_id FROM favorites WHERE user_id = ?", (telegram_id,))
+            return frozenset(row[0] for row in cursor.fetchall())
+        finally:
+            self._release_connection(conn)
+
+    def get_favorite_ids(self, telegram_id: int) -> frozenset:
+        """Ids of the user's favorite recipes, served from favorite_ids_cache when possible"""
+        favorite_ids = favorite_ids_cache.get(telegram_id)
+        if favorite_ids is None:
+            generation = favorite_ids_cache.generation()
+            favorite_ids = self._load_favorite_ids(telegram_id)
+            favorite_ids_cache.set(telegram_id, favorite_ids, generation)
+        return favorite_ids
+
+    def is_favorite(self, telegram_id: int, recipe_id: int) -> bool:
+        return recipe_id in self.get_favorite_ids(telegram_id)
+
+    def get_recipe_details(self, recipe_id: int) -> Optional[dict]:
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {', '.join(RECIPE_COLUMNS)}
                 FROM recipes 
                 WHERE id = ?
             """, (recipe_id,))
             result = cursor.fetchone()
-            
-            if result:
-                return {
-                    'title': result[0],
-                    'ingredients': result[1],
-                    'cooking_time': result[2],
-                    'skill_level': result[3],
-                    'calories': result[4],
-                    'instructions': result[5],
-                    'instruction_voice': result[6],
-                    'image_path': result[7],
-                    'created_at': result[8],
-                    'owner_id': result[9]
-                }
-            return None
+            return dict(zip(RECIPE_COLUMNS, result)) if result else None
         finally:
-            conn.close() 
+            self._release_connection(conn) 
+
+    def patch_recipe(self, recipe_id: int, owner_id: int, **fields) -> Optional[dict]:
+        """Update only the given columns of a recipe the user owns.
+
+        Ownership is checked in the same statement; returns the updated
+        recipe (as get_recipe_details does), or None if it is not theirs.
+        """
+        unknown = set(fields) - set(PATCHABLE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Columns cannot be patched: {', '.join(sorted(unknown))}")
+
+        values = dict(fields)
+        for column, search_column in PATCHABLE_COLUMNS.items():
+            if search_column and column in fields:
+                values[search_column] = normalize_text(fields[column])
+        assignments = [f"{column} = ?" for column in values] + ["updated_at = datetime('now')"]
+
+        def op(cursor):
+            cursor.execute(f"""
+                UPDATE recipes
+                SET {', '.join(assignments)}
+                WHERE id = ? AND owner_id = ?
+                RETURNING {', '.join(RECIPE_COLUMNS)}
+            """, (*values.values(), recipe_id, owner_id))
+            return cursor.fetchone()
 
-    def update_recipe(self, recipe_id: int, telegram_id: int, recipe_data: dict) -> bool:
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            
-            # Check if recipe belongs to user
-            cursor.execute("""
-                SELECT id FROM recipes
+            result = self._write(op)
+            if not result:
+                return None
+            render_cache.invalidate(recipe_id)
+            return dict(zip(RECIPE_COLUMNS, result))
+        except Exception:
+            logger.exception("Error updating recipe")
+            return None
+
+    def store_media_bytes(self, data: bytes, kind: str) -> Optional[str]:
+        """Write a downloaded photo or voice into the media store; returns its stored path"""
+        try:
+            return self.media.store_bytes(data, kind)
+        except Exception:
+            logger.exception("Error storing %s", kind)
+            return None
+
+    def retain_media(self, path: str) -> bool:
+        try:
+            return self.media.retain(path)
+        except Exception:
+            logger.exception("Error retaining media %s", path)
+            return False
+
+    def release_media(self, path: Optional[str]) -> bool:
+        """Drop a recipe's reference to a stored file, deleting it when unused"""
+        try:
+            return self.media.release(path)
+        except Exception:
+            logger.exception("Error releasing media %s", path)
+            return False
+
+    def replace_recipe_media(self, recipe_id: int, telegram_id: int, media: str,
+                             file_id: Optional[str]) -> Optional[dict]:
+        """Point a recipe's photo or voice at a new Telegram file_id, or remove it with None.
+
+        The stored file (and a photo's preview) is released; the new one is
+        downloaded by media_pipeline and linked with set_recipe_media_path().
+        Returns the updated recipe, or None if it is not the user's.
+        """
+        path_column, file_id_column = MEDIA_COLUMNS[media]
+        # A photo's preview is derived from it and goes with it
+        stale_columns = [path_column, 'image_preview_path'] if media == 'photo' else [path_column]
+        cleared = ', '.join(f"{column} = NULL" for column in stale_columns)
+        if media == 'photo':
+            cleared += ", image_preview_file_id = NULL"
+
+        # The writer runs one write at a time, so nothing can change the row in between
+        def op(cursor):
+            cursor.execute(f"""
+                SELECT {', '.join(stale_columns)} FROM recipes
                 WHERE id = ? AND owner_id = ?
             """, (recipe_id, telegram_id))
-            
-            if not cursor.fetchone():
-                return False  # Recipe doesn't belong to user
-            
+            released = cursor.fetchone()
+            if not released:
+                return None, None  # Recipe doesn't belong to user
+            cursor.execute(f"""
+                UPDATE recipes
+                SET {file_id_column} = ?, {cleared}, updated_at = datetime('now')
+                WHERE id = ?
+                RETURNING {', '.join(RECIPE_COLUMNS)}
+            """, (file_id, recipe_id))
+            return released, dict(zip(RECIPE_COLUMNS, cursor.fetchone()))
+
+        try:
+            released, recipe = self._write(op)
+        except Exception:
+            logger.exception("Error replacing recipe media")
+            return None
+        if recipe is None:
+            return None
+
+        for path in released:
+            self.release_media(path)
+        return recipe
+
+    def set_recipe_preview(self, recipe_id: int, image_path: str, preview_path: str) -> bool:
+        """Attach a generated preview, unless the photo changed while it was rendered"""
+        def op(cursor):
             cursor.execute("""
-                UPDATE recipes 
-                SET title = ?, ingredients = ?, cooking_time = ?, 
-                    skill_level = ?, calories = ?, instructions = ?,
-                    instruction_voice = ?, image_path = ?, updated_at = datetime('now')
-                WHERE id = ? AND owner_id = ?
-            """, (
-                recipe_data['title'],
-                recipe_data['ingredients'],
-                recipe_data['cooking_time'],
-                recipe_data['skill_level'],
-                recipe_data['calories'],
-                recipe_data['instructions'],
-                recipe_data.get('instruction_voice'),
-                recipe_data.get('image_path'),
-                recipe_id,
-                telegram_id
-            ))
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error updating recipe: {e}")
+                UPDATE recipes SET image_preview_path = ?, image_preview_file_id = NULL
+                WHERE id = ? AND image_path = ? AND image_preview_path IS NULL
+            """, (preview_path, recipe_id, image_path))
+            return cursor.rowcount > 0
+
+        try:
+            return self._write(op)
+        except Exception:
+            logger.exception("Error saving preview path")
+            return False
+
+    def set_listing_photo_file_id(self, recipe_id: int, file_id: str) -> bool:
+        """Remember the file_id of the photo listings send: the preview if there is one"""
+        def op(cursor):
+            cursor.execute("""
+                UPDATE recipes
+                SET image_preview_file_id = CASE WHEN image_preview_path IS NULL
+                                                 THEN image_preview_file_id ELSE ? END,
+                    image_file_id = CASE WHEN image_preview_path IS NULL
+                                         THEN ? ELSE image_file_id END
+                WHERE id = ?
+            """, (file_id, file_id, recipe_id))
+            return cursor.rowcount > 0
+
+        try:
+            return self._write(op)
+        except Exception:
+            logger.exception("Error saving file_id")
+            return False
+
+    def set_recipe_media_path(self, recipe_id: int, media: str, path: str, file_id: str) -> bool:
+        """Link a finished background download to its recipe.
+
+        Only applies while the recipe still carries `file_id` and has no stored
+        file, so a download that lost the race against an edit is discarded.
+        """
+        path_column, file_id_column = MEDIA_COLUMNS[media]
+        def op(cursor):
+            cursor.execute(f"""
+                UPDATE recipes SET {path_column} = ?
+                WHERE id = ? AND {file_id_column} = ? AND {path_column} IS NULL
+            """, (path, recipe_id, file_id))
+            return cursor.rowcount > 0
+
+        try:
+            return self._write(op)
+        except Exception:
+            logger.exception("Error saving media path")
+            return False
+
+    def set_recipe_file_id(self, recipe_id: int, media: str, file_id: str) -> bool:
+        """Remember the Telegram file_id of a recipe's photo or voice after an upload"""
+        column = MEDIA_COLUMNS[media][1]
+        def op(cursor):
+            cursor.execute(f"UPDATE recipes SET {column} = ? WHERE id = ?", (file_id, recipe_id))
+            return cursor.rowcount > 0
+
+        try:
+            return self._write(op)
+        except Exception:
+            logger.exception("Error saving file_id")
             return False
-        finally:
-            conn.close()
\ No newline at end of file
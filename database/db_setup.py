@@ -1,8 +1,21 @@
+import logging
 import sqlite3
+from database.db_operations import DB_NAME
+from database.media_store import import_legacy_file
+from utils.text_normalizer import normalize_text
 
-def init_db():
-    conn = sqlite3.connect("recipes.db")
-    cursor = conn.cursor()
+logger = logging.getLogger(__name__)
+
+# Schema migrations, applied in order. The index of the last applied step is
+# stored in PRAGMA user_version. Steps 1-4 are idempotent because databases
+# created before versioning (user_version 0) may already contain any of them.
+# Append new steps to the end; never edit or reorder applied ones.
+
+def _columns(cursor, table: str) -> set:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+def _create_base_schema(cursor):
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS recipes (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -19,14 +32,11 @@ def init_db():
         owner_id INTEGER,
         FOREIGN KEY (owner_id) REFERENCES users (telegram_id)
     )""")
-    
-    # Add owner_id column if it doesn't exist
-    try:
+
+    # Databases from before recipes had owners
+    if 'owner_id' not in _columns(cursor, 'recipes'):
         cursor.execute("ALTER TABLE recipes ADD COLUMN owner_id INTEGER REFERENCES users(telegram_id)")
-        print("Added owner_id column to recipes table")
-    except sqlite3.OperationalError:
-        print("owner_id column already exists")
-    
+
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -40,7 +50,7 @@ def init_db():
         banned_at TIMESTAMP,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )""")
-    
+
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS favorites (
         user_id INTEGER,
@@ -48,7 +58,7 @@ def init_db():
         FOREIGN KEY (user_id) REFERENCES users (id),
         FOREIGN KEY (recipe_id) REFERENCES recipes (id)
     )""")
-    
+
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS comments (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -59,6 +69,196 @@ def init_db():
         FOREIGN KEY (user_id) REFERENCES users (id),
         FOREIGN KEY (recipe_id) REFERENCES recipes (id)
     )""")
-    
-    conn.commit()
-    conn.close() 
\ No newline at end of file
+
+def _add_search_columns(cursor):
+    """Normalized shadow columns that feed the full-text index"""
+    if 'search_title' in _columns(cursor, 'recipes'):
+        return
+
+    # A full-text index over the raw columns is rebuilt over the shadow columns later
+    for name in ('recipes_fts_ai', 'recipes_fts_ad', 'recipes_fts_au'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute("DROP TABLE IF EXISTS recipes_fts")
+
+    for column in ('search_title', 'search_ingredients', 'search_instructions'):
+        cursor.execute(f"ALTER TABLE recipes ADD COLUMN {column} TEXT")
+
+    cursor.execute("SELECT id, title, ingredients, instructions FROM recipes")
+    cursor.executemany("""
+        UPDATE recipes
+        SET search_title = ?, search_ingredients = ?, search_instructions = ?
+        WHERE id = ?
+    """, [
+        (normalize_text(title), normalize_text(ingredients), normalize_text(instructions), recipe_id)
+        for recipe_id, title, ingredients, instructions in cursor.fetchall()
+    ])
+
+def _add_media_file_ids(cursor):
+    """Telegram file_ids of the uploaded media, reused instead of re-uploading files"""
+    if 'image_file_id' in _columns(cursor, 'recipes'):
+        return
+    cursor.execute("ALTER TABLE recipes ADD COLUMN image_file_id TEXT")
+    cursor.execute("ALTER TABLE recipes ADD COLUMN voice_file_id TEXT")
+
+def _create_fts_index(cursor):
+    """Full-text index over the normalized recipe text, kept in sync by triggers"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recipes_fts'")
+    fts_exists = cursor.fetchone() is not None
+
+    cursor.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+        search_title, search_ingredients, search_instructions,
+        content='recipes', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""")
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_ai AFTER INSERT ON recipes BEGIN
+        INSERT INTO recipes_fts (rowid, search_title, search_ingredients, search_instructions)
+        VALUES (new.id, new.search_title, new.search_ingredients, new.search_instructions);
+    END""")
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_ad AFTER DELETE ON recipes BEGIN
+        INSERT INTO recipes_fts (recipes_fts, rowid, search_title, search_ingredients, search_instructions)
+        VALUES ('delete', old.id, old.search_title, old.search_ingredients, old.search_instructions);
+    END""")
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_au
+    AFTER UPDATE OF search_title, search_ingredients, search_instructions ON recipes BEGIN
+        INSERT INTO recipes_fts (recipes_fts, rowid, search_title, search_ingredients, search_instructions)
+        VALUES ('delete', old.id, old.search_title, old.search_ingredients, old.search_instructions);
+        INSERT INTO recipes_fts (rowid, search_title, search_ingredients, search_instructions)
+        VALUES (new.id, new.search_title, new.search_ingredients, new.search_instructions);
+    END""")
+
+    # Backfill recipes that were stored before the index existed
+    if not fts_exists:
+        cursor.execute("INSERT INTO recipes_fts (recipes_fts) VALUES ('rebuild')")
+
+def _create_indexes(cursor):
+    # get_user_recipes: WHERE owner_id = ? ORDER BY created_at DESC, id DESC
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_recipes_owner_created
+    ON recipes (owner_id, created_at DESC, id DESC)""")
+
+    # Newest recipes across all users
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_recipes_created
+    ON recipes (created_at DESC, id DESC)""")
+
+    # Drop duplicate favorites so the pair can be unique
+    cursor.execute("""
+    DELETE FROM favorites
+    WHERE rowid NOT IN (SELECT MIN(rowid) FROM favorites GROUP BY user_id, recipe_id)""")
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_favorites_user_recipe
+    ON favorites (user_id, recipe_id)""")
+
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_comments_recipe
+    ON comments (recipe_id, created_at)""")
+
+def _key_favorites(cursor):
+    """Favorites keyed by (user_id, recipe_id); user_id is the Telegram user id"""
+    cursor.execute("""
+    CREATE TABLE favorites_new (
+        user_id INTEGER NOT NULL,
+        recipe_id INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, recipe_id),
+        FOREIGN KEY (user_id) REFERENCES users (telegram_id),
+        FOREIGN KEY (recipe_id) REFERENCES recipes (id)
+    ) WITHOUT ROWID""")
+    cursor.execute("""
+    INSERT OR IGNORE INTO favorites_new (user_id, recipe_id)
+    SELECT user_id, recipe_id FROM favorites
+    WHERE user_id IS NOT NULL AND recipe_id IS NOT NULL""")
+    cursor.execute("DROP TABLE favorites")
+    cursor.execute("ALTER TABLE favorites_new RENAME TO favorites")
+
+def _create_media_store(cursor):
+    """Manifest of the content-addressed media store; imports files from photos/ and voices/"""
+    cursor.execute("""
+    CREATE TABLE media_files (
+        sha256 TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        path TEXT NOT NULL UNIQUE,
+        size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID""")
+
+    for column, kind in (('image_path', 'photo'), ('instruction_voice', 'voice')):
+        cursor.execute(f"SELECT id, {column} FROM recipes WHERE {column} IS NOT NULL")
+        for recipe_id, old_path in cursor.fetchall():
+            path = import_legacy_file(cursor, old_path, kind)
+            cursor.execute(f"UPDATE recipes SET {column} = ? WHERE id = ?", (path, recipe_id))
+
+def _add_image_previews(cursor):
+    """Downscaled copy of each photo that listings send instead of the original"""
+    cursor.execute("ALTER TABLE recipes ADD COLUMN image_preview_path TEXT")
+    cursor.execute("ALTER TABLE recipes ADD COLUMN image_preview_file_id TEXT")
+
+def _create_persistence_tables(cursor):
+    """Conversation states and user/chat data of the bot, see database/persistence.py"""
+    cursor.execute("""
+    CREATE TABLE persisted_conversations (
+        name TEXT NOT NULL,
+        key TEXT NOT NULL,
+        state BLOB NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (name, key)
+    ) WITHOUT ROWID""")
+    for table, column in (('persisted_user_data', 'user_id'), ('persisted_chat_data', 'chat_id')):
+        cursor.execute(f"""
+        CREATE TABLE {table} (
+            {column} INTEGER PRIMARY KEY,
+            data BLOB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""")
+
+MIGRATIONS = [
+    _create_base_schema,
+    _add_search_columns,
+    _add_media_file_ids,
+    _create_fts_index,
+    _create_indexes,
+    _key_favorites,
+    _create_media_store,
+    _add_image_previews,
+    _create_persistence_tables,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def init_db(db_name: str = DB_NAME):
+    """Bring the database schema up to SCHEMA_VERSION.
+
+    Each pending migration runs in its own transaction together with the
+    user_version bump, so an interrupted upgrade resumes where it stopped.
+    A database that is already current costs a single PRAGMA read.
+    """
+    conn = sqlite3.connect(db_name, isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(
+                f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})"
+            )
+
+        for number in range(version + 1, SCHEMA_VERSION + 1):
+            migration = MIGRATIONS[number - 1]
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {number}")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            logger.info("Applied migration %s: %s", number, migration.__name__.strip('_'))
+    finally:
+        conn.close()
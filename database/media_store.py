@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import uuid
+from typing import Optional
+from database.writer import get_writer
+
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', 'media')
+EXTENSIONS = {'photo': '.jpg', 'voice': '.ogg', 'preview': '.jpg'}
+
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def content_path(digest: str, kind: str, root: str = MEDIA_ROOT) -> str:
+    """media/<kind>s/ab/cd/abcd....ext - two levels of shards keep directories small"""
+    return os.path.join(root, f"{kind}s", digest[:2], digest[2:4], digest + EXTENSIONS[kind])
+
+class MediaStore:
+    """Content-addressed store for recipe photos, their previews and voices.
+
+    Files are named by their SHA-256, so identical uploads are stored once.
+    The media_files table is the manifest: it maps each file to its path and
+    counts the recipes referencing it. A path that is in the manifest exists
+    on disk, so display code never needs to stat files. Manifest writes go
+    through the database writer, which also serializes them against each
+    other, so a file cannot be unlinked while another write re-references it.
+    """
+
+    def __init__(self, db_name: str, root: str = MEDIA_ROOT):
+        self.root = root
+        self._writer = get_writer(db_name)
+
+    def temp_path(self, kind: str) -> str:
+        """A fresh path inside the store to download into before store_file()"""
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        return os.path.join(tmp_dir, uuid.uuid4().hex + EXTENSIONS[kind] + '.part')
+
+    def store_file(self, src_path: str, kind: str) -> str:
+        """Move a downloaded file into the store and take a reference to it.
+
+        Returns the stored path. If the same content is already stored, the
+        source file is discarded and the existing copy gains a reference; its
+        path is returned, which may be under another kind's directory.
+        """
+        digest = file_digest(src_path)
+
+        def op(cursor):
+            cursor.execute("""
+                UPDATE media_files SET refcount = refcount + 1
+                WHERE sha256 = ?
+                RETURNING path
+            """, (digest,))
+            row = cursor.fetchone()
+            if row is not None:
+                return row[0], True
+            path = content_path(digest, kind, self.root)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(src_path, path)
+            cursor.execute("""
+                INSERT INTO media_files (sha256, kind, path, size, refcount)
+                VALUES (?, ?, ?, ?, 1)
+            """, (digest, kind, path, os.path.getsize(path)))
+            return path, False
+
+        path, existing = self._writer.execute(op)
+        if existing:
+            os.remove(src_path)
+        return path
+
+    def store_bytes(self, data: bytes, kind: str) -> str:
+        """Write downloaded bytes to a temp file, then move them into the store like store_file()"""
+        tmp_path = self.temp_path(kind)
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            return self.store_file(tmp_path, kind)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def retain(self, path: str) -> bool:
+        """Take another reference to a stored file; False if it is not in the store"""
+        def op(cursor):
+            cursor.execute("UPDATE media_files SET refcount = refcount + 1 WHERE path = ?", (path,))
+            return cursor.rowcount > 0
+
+        return self._writer.execute(op)
+
+    def release(self, path: Optional[str]) -> bool:
+        """Drop one reference to a stored file, deleting it with the last one"""
+        if not path:
+            return False
+
+        def op(cursor):
+            cursor.execute("""
+                UPDATE media_files SET refcount = refcount - 1
+                WHERE path = ?
+                RETURNING refcount
+            """, (path,))
+            row = cursor.fetchone()
+            if row is None:
+                return False, False
+            if row[0] <= 0:
+                cursor.execute("DELETE FROM media_files WHERE path = ?", (path,))
+                return True, True
+            return True, False
+
+        released, last = self._writer.execute(op)
+        if last:
+            # Only once the DELETE is committed; a rolled-back release must
+            # leave the file. The unlink runs as a write of its own so no
+            # store_file() of the same content can slip in between the check
+            # and the unlink.
+            self._writer.execute(self._unlink_unreferenced(path))
+        return released
+
+    @staticmethod
+    def _unlink_unreferenced(path: str):
+        def op(cursor):
+            cursor.execute("SELECT 1 FROM media_files WHERE path = ?", (path,))
+            if cursor.fetchone() is None:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return op
+
+def import_legacy_file(cursor: sqlite3.Cursor, src_path: str, kind: str, root: str = MEDIA_ROOT) -> Optional[str]:
+    """Copy a file from the old flat photos/ or voices/ directories into the store.
+
+    Used by the schema migration; the original stays in place so a failed
+    migration can be retried. Returns the stored path, or None if the file is gone.
+    """
+    if not os.path.isfile(src_path):
+        return None
+    digest = file_digest(src_path)
+    path = content_path(digest, kind, root)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.part'
+        try:
+            os.link(src_path, tmp_path)
+        except OSError:
+            with open(src_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                    dst.write(chunk)
+        os.replace(tmp_path, path)
+    cursor.execute("""
+        INSERT INTO media_files (sha256, kind, path, size, refcount)
+        VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT (sha256) DO UPDATE SET refcount = refcount + 1
+    """, (digest, kind, path, os.path.getsize(path)))
+    return path
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import os
+import pickle
+from typing import Dict, Optional, Set, Tuple
+from telegram.ext import BasePersistence, PersistenceInput
+from database.connection_pool import get_pool
+from database.db_operations import DB_NAME
+from database.writer import get_writer
+
+logger = logging.getLogger(__name__)
+
+# Seconds between writes of changed conversation states and user/chat data;
+# a crash loses at most this much progress
+PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', '5'))
+
+# Tables of the data kept per user and per chat, with their key column
+_TABLES = {
+    'user': ('persisted_user_data', 'user_id'),
+    'chat': ('persisted_chat_data', 'chat_id'),
+}
+
+class SQLitePersistence(BasePersistence):
+    """Conversation states, user_data and chat_data stored in the bot's database.
+
+    python-telegram-bot hands over only the entries touched since its last
+    run, every PERSISTENCE_INTERVAL seconds; they are staged and written in
+    one transaction through the database writer. user_data and chat_data are
+    loaded per user or chat on their first update instead of all at startup,
+    so startup only reads the conversation states. bot_data and callback data
+    are not persisted.
+    """
+
+    def __init__(self, db_name: str = DB_NAME, update_interval: float = PERSISTENCE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self._pool = get_pool(db_name)
+        self._writer = get_writer(db_name)
+        # Staged changes: (kind, key) -> the new value pickled, or None to delete the row
+        self._pending: Dict[Tuple[str, object], Optional[bytes]] = {}
+        self._flushing: Optional[asyncio.Task] = None
+        self._writes: Set[asyncio.Future] = set()
+        self._loaded: Dict[str, Set[int]] = {'user': set(), 'chat': set()}
+
+    @staticmethod
+    def _conversation_key(key: Tuple[int, ...]) -> str:
+        return json.dumps(list(key))
+
+    def _read(self, sql: str, params: tuple = ()) -> list:
+        conn = self._pool.acquire()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            self._pool.release(conn)
+
+    def _load_data(self, kind: str, key: int) -> Optional[dict]:
+        table, column = _TABLES[kind]
+        rows = self._read(f"SELECT data FROM {table} WHERE {column} = ?", (key,))
+        return pickle.loads(rows[0][0]) if rows else None
+
+    async def _refresh(self, kind: str, key: int, data: dict):
+        # Only the first update of a user or chat reads the database
+        if key in self._loaded[kind]:
+            return
+        self._loaded[kind].add(key)
+        if (kind, key) in self._pending:
+            return  # Staged data is newer than the stored row
+        stored = await asyncio.to_thread(self._load_data, kind, key)
+        if stored:
+            data.update(stored)
+
+    def _stage(self, kind: str, key, value):
+        # Pickled here, on the event loop: the writer thread must not read
+        # user_data and chat_data dicts that handlers keep changing
+        self._pending[(kind, key)] = None if value is None else pickle.dumps(value)
+        # One flush per update_persistence() run: every change of the run is
+        # staged before the task gets to run
+        if self._flushing is None:
+            self._flushing = asyncio.get_running_loop().create_task(self._flush_pending())
+
+    async def _flush_pending(self):
+        self._flushing = None
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        write = asyncio.wrap_future(self._writer.submit(lambda cursor: self._write(cursor, pending)))
+        self._writes.add(write)
+        try:
+            await write
+        except Exception:
+            logger.exception("Error saving conversations")
+        finally:
+            self._writes.discard(write)
+
+    @staticmethod
+    def _write(cursor, pending: dict):
+        upserts = {kind: [] for kind in ('conversation', *_TABLES)}
+        deletes = {kind: [] for kind in ('conversation', *_TABLES)}
+        for (kind, key), value in pending.items():
+            key = key if kind == 'conversation' else (key,)
+            if value is None:
+                deletes[kind].append(key)
+            else:
+                upserts[kind].append((*key, value))
+
+        cursor.executemany("""
+            INSERT INTO persisted_conversations (name, key, state) VALUES (?, ?, ?)
+            ON CONFLICT (name, key) DO UPDATE SET state = excluded.state, updated_at = datetime('now')
+        """, upserts['conversation'])
+        cursor.executemany(
+            "DELETE FROM persisted_conversations WHERE name = ? AND key = ?", deletes['conversation']
+        )
+        for kind, (table, column) in _TABLES.items():
+            cursor.executemany(f"""
+                INSERT INTO {table} ({column}, data) VALUES (?, ?)
+                ON CONFLICT ({column}) DO UPDATE SET data = excluded.data, updated_at = datetime('now')
+            """, upserts[kind])
+            cursor.executemany(f"DELETE FROM {table} WHERE {column} = ?", deletes[kind])
+
+    async def get_conversations(self, name: str) -> Dict[Tuple[int, ...], object]:
+        rows = await asyncio.to_thread(
+            self._read, "SELECT key, state FROM persisted_conversations WHERE name = ?", (name,)
+        )
+        return {tuple(json.loads(key)): pickle.loads(state) for key, state in rows}
+
+    async def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]):
+        self._stage('conversation', (name, self._conversation_key(key)), new_state)
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        await self._refresh('user', user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        await self._refresh('chat', chat_id, chat_data)
+
+    async def update_user_data(self, user_id: int, data: dict):
+        self._stage('user', user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        self._stage('chat', chat_id, data)
+
+    async def drop_user_data(self, user_id: int):
+        self._stage('user', user_id, None)
+
+    async def drop_chat_data(self, chat_id: int):
+        self._stage('chat', chat_id, None)
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def flush(self):
+        """Write what is still staged; called by the application when it stops"""
+        await self._flush_pending()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
@@ -0,0 +1,148 @@
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+from database.connection_pool import PRAGMAS
+
+# Most writes a single transaction may carry; the rest wait for the next one
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '64'))
+
+WriteOp = Callable[[sqlite3.Cursor], Any]
+
+class DatabaseWriter:
+    """Owns the only write connection to a database and commits in batches.
+
+    Callers submit a write as a function of a cursor and get a Future for
+    its return value. One thread runs them: it takes every write that is
+    queued (up to WRITE_BATCH_SIZE) and runs them in one transaction, each
+    inside its own savepoint so a failing write is rolled back alone. Futures
+    resolve after the COMMIT, so a caller that sees its result can rely on
+    it being durable and visible to readers.
+
+    With a single writer SQLite never answers "database is locked", and
+    writes that arrive while a commit is running share the next one.
+    Readers keep their own WAL connections from the pool.
+    """
+
+    def __init__(self, db_name: str, batch_size: int = WRITE_BATCH_SIZE):
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._writes = 0
+
+    def submit(self, op: WriteOp) -> Future:
+        future = Future()
+        self._queue.put((op, future))
+        if self._thread is None:
+            self._start()
+        return future
+
+    def execute(self, op: WriteOp) -> Any:
+        """Submit a write and block until it is committed; re-raises its error"""
+        return self.submit(op).result()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: the writer issues BEGIN/COMMIT itself
+        conn = sqlite3.connect(self.db_name, isolation_level=None, check_same_thread=False)
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                batch = self._next_batch()
+                stop = any(op is None for op, _ in batch)
+                writes = [(op, future) for op, future in batch if op is not None]
+                if writes:
+                    self._commit(conn, writes)
+                for op, future in batch:
+                    if op is None:
+                        future.set_result(None)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, writes: list):
+        cursor = conn.cursor()
+        results = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for op, future in writes:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cursor.execute("SAVEPOINT write")
+                try:
+                    results.append((future, op(cursor)))
+                    cursor.execute("RELEASE write")
+                except BaseException as e:
+                    cursor.execute("ROLLBACK TO write")
+                    cursor.execute("RELEASE write")
+                    future.set_exception(e)
+            cursor.execute("COMMIT")
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for future, _ in results:
+                future.set_exception(e)
+            # Writes not reached before the failure
+            for _, future in writes:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self._batches += 1
+        self._writes += len(writes)
+        for future, result in results:
+            future.set_result(result)
+
+    def close(self):
+        """Finish the queued writes and stop the thread"""
+        if self._thread is None:
+            return
+        future = Future()
+        self._queue.put((None, future))
+        future.result()
+        self._thread.join()
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            'batches': self._batches,
+            'writes': self._writes,
+            'writes_per_batch': round(self._writes / self._batches, 2) if self._batches else 0.0,
+        }
+
+_writers: Dict[str, DatabaseWriter] = {}
+_writers_lock = threading.Lock()
+
+def get_writer(db_name: str) -> DatabaseWriter:
+    """Return the shared writer for a database file, creating it on first use."""
+    with _writers_lock:
+        writer = _writers.get(db_name)
+        if writer is None:
+            writer = DatabaseWriter(db_name)
+            _writers[db_name] = writer
+        return writer
@@ -1,21 +1,32 @@
-from telegram import Update, ReplyKeyboardMarkup
+import functools
+from telegram import Update, ReplyKeyboardMarkup, InlineQueryResultsButton
 from telegram.ext import ContextTypes, ConversationHandler
-from database.db_operations import DatabaseManager
+from database.async_db import AsyncDatabaseManager
+from utils.outbound import BULK
 
 # States for registration
 (REGISTER_USERNAME, BAN_REASON) = range(2)
 
-db = DatabaseManager()
+db = AsyncDatabaseManager()
 
 def require_auth(func):
     """Decorator to check if user is registered and not banned"""
+    @functools.wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         user_id = update.effective_user.id
         
-        if not db.is_user_registered(user_id):
-            await update.message.reply_text(
-                "شما هنوز ثبت نام نکرده‌اید. لطفا ابتدا با دستور /start ثبت نام کنید."
-            )
+        if not await db.is_user_registered(user_id):
+            text = "شما هنوز ثبت نام نکرده‌اید. لطفا ابتدا با دستور /start ثبت نام کنید."
+            if update.callback_query:
+                await update.callback_query.answer(text, show_alert=True)
+            elif update.inline_query:
+                # Per user and uncached, so the answer changes right after registering
+                await update.inline_query.answer(
+                    [], cache_time=0, is_personal=True,
+                    button=InlineQueryResultsButton(text="ثبت نام در ربات", start_parameter="register")
+                )
+            else:
+                await update.effective_message.reply_text(text)
             return ConversationHandler.END
             
         return await func(update, context, *args, **kwargs)
@@ -23,6 +34,7 @@ def require_auth(func):
 
 def admin_only(func):
     """Decorator to check if user is super admin"""
+    @functools.wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         user_id = update.effective_user.id
         
@@ -36,7 +48,7 @@ def admin_only(func):
 async def start_registration(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
-    if db.is_user_registered(user.id):
+    if await db.is_user_registered(user.id):
         keyboard = [
             ['/add_recipe', '/my_recipes'],
             ['/search_recipes', '/calculate_bmi'],
@@ -65,7 +77,7 @@ async def register_username(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = context.user_data['telegram_id']
     full_name = context.user_data['full_name']
     
-    success = db.register_user(
+    success = await db.register_user(
         telegram_id=telegram_id,
         username=username,
         full_name=full_name
@@ -104,7 +116,7 @@ async def ban_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = int(context.args[0])
     
     # Check if user exists
-    if not db.is_user_registered(user_id):
+    if not await db.is_user_registered(user_id):
         await update.message.reply_text("کاربر مورد نظر یافت نشد.")
         return ConversationHandler.END
     
@@ -126,9 +138,9 @@ async def receive_ban_reason(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = context.user_data.get('ban_user_id')
     reason = update.message.text
     
-    if db.ban_user(user_id, reason):
+    if await db.ban_user(user_id, reason):
         # Get user info
-        user_profile = db.get_user_profile(user_id)
+        user_profile = await db.get_user_profile(user_id)
         username = user_profile.get('username', 'نامشخص') if user_profile else 'نامشخص'
         
         await update.message.reply_text(
@@ -142,7 +154,8 @@ async def receive_ban_reason(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 user_id,
                 f"حساب کاربری شما مسدود شد.\n"
                 f"دلیل: {reason}\n\n"
-                "در صورت اعتراض با پشتیبانی تماس بگیرید."
+                "در صورت اعتراض با پشتیبانی تماس بگیرید.",
+                rate_limit_args={'priority': BULK}
             )
         except Exception:
             pass  # User might have blocked the bot
@@ -158,7 +171,7 @@ async def cancel_ban(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @require_auth
 async def show_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    profile = db.get_user_profile(user_id)
+    profile = await db.get_user_profile(user_id)
     
     if profile:
         status = "فعال ✅" if profile['is_active'] else "غیرفعال ❌"
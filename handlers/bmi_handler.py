@@ -1,12 +1,12 @@
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
-from database.db_operations import DatabaseManager
+from database.async_db import AsyncDatabaseManager
 
 # States for BMI conversation
 BMI_HEIGHT, BMI_WEIGHT = range(2)
 
 # Initialize database manager
-db = DatabaseManager()
+db = AsyncDatabaseManager()
 
 async def calculate_bmi_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("لطفاً قد خود را به سانتی‌متر وارد کنید:")
@@ -28,7 +28,7 @@ async def receive_bmi_weight(update: Update, context: ContextTypes.DEFAULT_TYPE)
         height = context.user_data['height'] / 100  # convert cm to m
         bmi = weight / (height * height)
         
-        if db.save_user_bmi(update.effective_user.id, bmi):
+        if await db.save_user_bmi(update.effective_user.id, bmi):
             message = f"شاخص BMI شما: {bmi:.1f}\n\n"
             if bmi < 18.5:
                 message += "پیشنهاد: تمرکز روی غذاهای پرپروتئین و پرکالری."
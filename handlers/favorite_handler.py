@@ -1,104 +1,83 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database.db_operations import DatabaseManager
+from database.async_db import AsyncDatabaseManager
 from handlers.auth_handler import require_auth
-import os
+from utils.pager import PagerSource, register_pager, send_pager
+from utils.render_cache import render_cache
+import logging
 import telegram
 
-db = DatabaseManager()
+db = AsyncDatabaseManager()
+logger = logging.getLogger(__name__)
+
+def favorite_button(recipe_id: int, is_favorite: bool) -> InlineKeyboardButton:
+    """Button that sets the favorite state explicitly, so repeated taps are harmless"""
+    if is_favorite:
+        return InlineKeyboardButton("⭐️ حذف از علاقه‌مندی‌ها", callback_data=f"favorite_{recipe_id}_off")
+    return InlineKeyboardButton("⭐️ افزودن به علاقه‌مندی‌ها", callback_data=f"favorite_{recipe_id}_on")
 
 @require_auth
 async def toggle_favorite(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    print('\n\n----toggle_favorite----\n\n')
     query = update.callback_query
-    await query.answer()
     
-    recipe_id = int(query.data.split('_')[1])
+    # favorite_<recipe_id>_<on|off>; older buttons without a state toggle
+    parts = query.data.split('_')
+    recipe_id = int(parts[1])
     user_id = update.effective_user.id
     
-    print('toggle_favorite query.data', recipe_id, user_id)
-    
-    is_favorite = db.is_favorite(user_id, recipe_id)
+    if len(parts) > 2:
+        make_favorite = parts[2] == 'on'
+    else:
+        make_favorite = not await db.is_favorite(user_id, recipe_id)
     
-    print('is_favorite', is_favorite)
+    logger.debug("Toggling favorite", extra={'recipe_id': recipe_id, 'user_id': user_id, 'favorite': make_favorite})
     
-    if is_favorite:
-        success = db.remove_from_favorites(user_id, recipe_id)
-        message = "از علاقه‌مندی‌ها حذف شد ❌"
-        new_button_text = "⭐️ افزودن به علاقه‌مندی‌ها"
-    else:
-        success = db.add_to_favorites(user_id, recipe_id)
-        message = "به علاقه‌مندی‌ها اضافه شد ⭐️"
-        new_button_text = "⭐️ حذف از علاقه‌مندی‌ها"
+    if not await db.set_favorite(user_id, recipe_id, make_favorite):
+        await query.answer("خطا در انجام عملیات. لطفاً دوباره تلاش کنید.")
+        return
     
-    if success:
-        # Update the favorite button
-        keyboard = []
-        for row in query.message.reply_markup.inline_keyboard:
-            new_row = []
-            for button in row:
-                if button.callback_data.startswith('favorite_'):
-                    # Create new button with updated text
-                    new_button = InlineKeyboardButton(new_button_text, callback_data=button.callback_data)
-                    new_row.append(new_button)
-                else:
-                    new_row.append(button)
-            keyboard.append(new_row)
-            
-        try:
-            await query.message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(keyboard))
-        except telegram.error.BadRequest as e:
-            if "message is not modified" not in str(e).lower():
-                raise e
+    # Flip the favorite button, keeping the rest of the keyboard
+    keyboard = []
+    for row in query.message.reply_markup.inline_keyboard:
+        keyboard.append([
+            favorite_button(recipe_id, make_favorite)
+            if (button.callback_data or '').startswith('favorite_') else button
+            for button in row
+        ])
         
-        await query.message.reply_text(message)
-    else:
-        await query.message.reply_text("خطا در انجام عملیات. لطفاً دوباره تلاش کنید.")
+    try:
+        await query.message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(keyboard))
+    except telegram.error.BadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            raise e
+    
+    await query.answer("به علاقه‌مندی‌ها اضافه شد ⭐️" if make_favorite else "از علاقه‌مندی‌ها حذف شد ❌")
+
+def _render_favorite(number: int, recipe: tuple):
+    (recipe_id, title, ingredients, cooking_time, skill_level, calories,
+     image_path, owner_username, created_at, image_file_id, updated_at) = recipe
+    
+    card = render_cache.get(recipe_id, updated_at, 'favorites', lambda: (
+        f"🍳 {title}\n"
+        f"👨‍🍳 آشپز: {owner_username or 'ناشناس'}\n"
+        f"⏱ زمان پخت: {cooking_time} دقیقه\n"
+        f"📊 سطح دشواری: {skill_level}\n"
+        f"🔥 کالری: {calories}\n"
+        f"📝 مواد لازم: {ingredients[:100]}..."
+    ))
+    return f"{number}. {card}", recipe_id
+
+async def _fetch_favorites(params: dict, cursor, limit: int):
+    return await db.get_user_favorites(params['user_id'], limit=limit, after=cursor)
+
+register_pager('favorites', PagerSource(
+    fetch=_fetch_favorites,
+    cursor_of=lambda recipe: (recipe[8], recipe[0]),  # (created_at, id)
+    render_item=_render_favorite,
+    header=lambda params: "📚 لیست دستور پخت‌های مورد علاقه شما:",
+    empty_text="شما هنوز دستور پختی را به علاقه‌مندی‌ها اضافه نکرده‌اید! ⭐️"
+))
 
 @require_auth
 async def view_favorites(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    favorites = db.get_user_favorites(user_id)
-    
-    if not favorites:
-        await update.message.reply_text("شما هنوز دستور پختی را به علاقه‌مندی‌ها اضافه نکرده‌اید! ⭐️")
-        return
-    
-    await update.message.reply_text("📚 لیست دستور پخت‌های مورد علاقه شما:")
-    
-    for recipe in favorites:
-        recipe_id, title, ingredients, cooking_time, skill_level, calories, image_path, owner_username = recipe
-        
-        message = (
-            f"🍳 {title}\n"
-            f"👨‍🍳 آشپز: {owner_username or 'ناشناس'}\n"
-            f"⏱ زمان پخت: {cooking_time} دقیقه\n"
-            f"📊 سطح دشواری: {skill_level}\n"
-            f"🔥 کالری: {calories}\n\n"
-            f"📝 مواد لازم:\n{ingredients[:100]}..."
-        )
-        
-        keyboard = [
-            [InlineKeyboardButton("👁 مشاهده کامل", callback_data=f"view_recipe_{recipe_id}")],
-            [InlineKeyboardButton("⭐️ حذف از علاقه‌مندی‌ها", callback_data=f"favorite_{recipe_id}")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        if image_path and os.path.exists(image_path):
-            try:
-                with open(image_path, 'rb') as photo:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=message,
-                        reply_markup=reply_markup
-                    )
-            except Exception:
-                await update.message.reply_text(
-                    message,
-                    reply_markup=reply_markup
-                )
-        else:
-            await update.message.reply_text(
-                message,
-                reply_markup=reply_markup
-            ) 
\ No newline at end of file
+    await send_pager(update.message, context, 'favorites', {'user_id': update.effective_user.id})
@@ -2,17 +2,27 @@ from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKe
 from telegram.ext import ContextTypes, ConversationHandler
 import sqlite3
 import os
-from database.db_operations import DatabaseManager
+from database.async_db import AsyncDatabaseManager
 from handlers.auth_handler import require_auth
 import logging
 from persiantools.jdatetime import JalaliDateTime
+from utils.text_normalizer import normalize_text
+from utils.pager import PagerSource, register_pager, send_pager
+from utils.media import send_cached_media
+from utils.media_pipeline import MediaPipeline
+from utils.cache import TTLCache
+from utils.render_cache import render_cache
+from handlers.favorite_handler import favorite_button
 import datetime
+import functools
 
 # Initialize database manager
-db = DatabaseManager()
+db = AsyncDatabaseManager()
+media_pipeline = MediaPipeline(db)
 
+@functools.lru_cache(maxsize=4096)
 def format_datetime(date_str):
-    """Convert datetime string to Jalali format"""
+    """Convert datetime string to Jalali format (memoized; many rows share a timestamp)"""
     try:
         dt = datetime.datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
         jdt = JalaliDateTime.to_jalali(dt)
@@ -81,7 +91,7 @@ async def receive_instructions(update: Update, context: ContextTypes.DEFAULT_TYP
 
 async def receive_instructions_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.text == 'خیر':
-        context.user_data['instruction_voice'] = None
+        context.user_data['voice_file_id'] = None
         await update.message.reply_text("عکس غذا را ارسال کنید (یا /skip را بزنید):")
         return PHOTO
     elif update.message.text == 'بله':
@@ -90,30 +100,21 @@ async def receive_instructions_voice(update: Update, context: ContextTypes.DEFAU
 
 async def receive_instructions_voice_record(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.voice:
-        if not os.path.exists('voices'):
-            os.makedirs('voices')
-        
-        voice = update.message.voice
-        voice_path = f"voices/{voice.file_id}.ogg"
-        file = await context.bot.get_file(voice.file_id)
-        await file.download_to_drive(voice_path)
-        context.user_data['instruction_voice'] = voice_path
+        # Downloaded in the background once the recipe is saved
+        context.user_data['voice_file_id'] = update.message.voice.file_id
     
     await update.message.reply_text("عکس غذا را ارسال کنید (یا /skip را بزنید):")
     return PHOTO
 
 async def receive_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.text == '/skip':
-        image_path = None
+        image_file_id = None
     else:
-        if not os.path.exists('photos'):
-            os.makedirs('photos')
-        
-        photo = update.message.photo[-1]
-        image_path = f"photos/{photo.file_id}.jpg"
-        file = await context.bot.get_file(photo.file_id)
-        await file.download_to_drive(image_path)
+        image_file_id = update.message.photo[-1].file_id
+    voice_file_id = context.user_data.get('voice_file_id')
     
+    # Media paths are filled in by media_pipeline when the downloads finish;
+    # until then the recipe's media is sent by file_id
     recipe_data = {
         'title': context.user_data['title'],
         'ingredients': context.user_data['ingredients'],
@@ -121,45 +122,52 @@ async def receive_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         'skill_level': context.user_data['skill_level'],
         'calories': context.user_data['calories'],
         'instructions': context.user_data['instructions'],
-        'instruction_voice': context.user_data.get('instruction_voice'),
-        'image_path': image_path
+        'instruction_voice': None,
+        'voice_file_id': voice_file_id,
+        'image_path': None,
+        'image_file_id': image_file_id
     }
     
-    if db.save_recipe(recipe_data, update.effective_user.id):
+    recipe_id = await db.save_recipe(recipe_data, update.effective_user.id)
+    if recipe_id:
+        if image_file_id:
+            media_pipeline.attach(context.bot, recipe_id, 'photo', image_file_id)
+        if voice_file_id:
+            media_pipeline.attach(context.bot, recipe_id, 'voice', voice_file_id)
         await update.message.reply_text("دستور پخت با موفقیت ذخیره شد! 🎉")
     else:
         await update.message.reply_text("خطا در ذخیره‌سازی. لطفاً دوباره تلاش کنید.")
     
     return ConversationHandler.END
 
+def _render_my_recipe(number: int, recipe: tuple):
+    recipe_id, title, cooking_time, skill_level, calories, created_at, updated_at = recipe
+    
+    # Preview block with Jalali date
+    card = render_cache.get(recipe_id, updated_at, 'my_recipes', lambda: (
+        f"🍳 {title}\n"
+        f"⏱ زمان پخت: {cooking_time} دقیقه\n"
+        f"📊 سطح دشواری: {skill_level}\n"
+        f"🔥 کالری: {calories}\n"
+        f"📅 تاریخ ثبت: {format_datetime(created_at)}"
+    ))
+    return f"{number}. {card}", recipe_id
+
+async def _fetch_my_recipes(params: dict, cursor, limit: int):
+    return await db.get_user_recipes(params['user_id'], limit=limit, after=cursor)
+
+register_pager('my_recipes', PagerSource(
+    fetch=_fetch_my_recipes,
+    cursor_of=lambda recipe: (recipe[5], recipe[0]),  # (created_at, id)
+    render_item=_render_my_recipe,
+    header=lambda params: "📚 لیست دستور پخت‌های شما:",
+    empty_text="شما هنوز دستور پختی ثبت نکرده‌اید! 🤔",
+    marked=lambda params: db.get_favorite_ids(params['user_id'])
+))
+
 @require_auth
 async def show_my_recipes(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    recipes = db.get_user_recipes(user_id)
-    
-    if not recipes:
-        await update.message.reply_text("شما هنوز دستور پختی ثبت نکرده‌اید! 🤔")
-        return
-    
-    await update.message.reply_text("📚 لیست دستور پخت‌های شما:")
-    
-    for recipe in recipes:
-        recipe_id, title, cooking_time, skill_level, calories, created_at = recipe
-        
-        # Create preview message with Jalali date
-        message = (
-            f"🍳 {title}\n"
-            f"⏱ زمان پخت: {cooking_time} دقیقه\n"
-            f"📊 سطح دشواری: {skill_level}\n"
-            f"🔥 کالری: {calories}\n"
-            f"📅 تاریخ ثبت: {format_datetime(created_at)}"
-        )
-        
-        # Add view button
-        keyboard = [[InlineKeyboardButton("👁 مشاهده کامل", callback_data=f"view_recipe_{recipe_id}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(message, reply_markup=reply_markup)
+    await send_pager(update.message, context, 'my_recipes', {'user_id': update.effective_user.id})
 
 async def view_recipe_details(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
@@ -167,11 +175,11 @@ async def view_recipe_details(update: Update, context: ContextTypes.DEFAULT_TYPE
         await query.answer()
         
         recipe_id = int(query.data.split('_')[2])
-        recipe = db.get_recipe_details(recipe_id)
+        recipe = await db.get_recipe_details(recipe_id)
         
         if recipe:
             # Create message with Jalali date
-            message = (
+            message = render_cache.get(recipe_id, recipe['updated_at'], 'details', lambda: (
                 f"🍳 {recipe['title']}\n\n"
                 f"📝 مواد لازم:\n{recipe['ingredients']}\n\n"
                 f"👨‍🍳 دستور پخت:\n{recipe['instructions']}\n\n"
@@ -179,46 +187,93 @@ async def view_recipe_details(update: Update, context: ContextTypes.DEFAULT_TYPE
                 f"��� سطح دشواری: {recipe['skill_level']}\n"
                 f"🔥 کالری: {recipe['calories']}\n"
                 f"📅 تاریخ ثبت: {format_datetime(recipe['created_at'])}"
-            )
+            ))
+            
+            user_id = update.effective_user.id
+            keyboard = [[favorite_button(recipe_id, await db.is_favorite(user_id, recipe_id))]]
             
             # Only show edit button if user is the owner
-            keyboard = []
-            if recipe['owner_id'] == update.effective_user.id:
+            if recipe['owner_id'] == user_id:
                 keyboard.append([InlineKeyboardButton("✏️ ویرایش دستور", callback_data=f"edit_recipe_{recipe_id}")])
             
-            reply_markup = InlineKeyboardMarkup(keyboard) if keyboard else None
+            reply_markup = InlineKeyboardMarkup(keyboard)
             
             await query.message.reply_text(
                 message, 
                 reply_markup=reply_markup
             )
             
-            # Send photo if available
-            if recipe['image_path']:
+            # Send photo if available, by file_id when Telegram already has it
+            if recipe['image_path'] or recipe['image_file_id']:
                 try:
-                    with open(recipe['image_path'], 'rb') as photo:
-                        await query.message.reply_photo(photo)
+                    await send_cached_media(
+                        query.message.reply_photo, 'photo',
+                        recipe['image_file_id'], recipe['image_path'],
+                        lambda file_id: db.set_recipe_file_id(recipe_id, 'photo', file_id)
+                    )
                 except Exception as e:
                     await query.message.reply_text("(تصویر در دسترس نیست)")
             
             # Send voice instruction if available
-            if recipe['instruction_voice']:
+            if recipe['instruction_voice'] or recipe['voice_file_id']:
                 try:
-                    with open(recipe['instruction_voice'], 'rb') as voice:
-                        await query.message.reply_voice(voice)
+                    await send_cached_media(
+                        query.message.reply_voice, 'voice',
+                        recipe['voice_file_id'], recipe['instruction_voice'],
+                        lambda file_id: db.set_recipe_file_id(recipe_id, 'voice', file_id)
+                    )
                 except Exception as e:
                     await query.message.reply_text("(فایل صوتی در دسترس نیست)")
         else:
             await query.message.reply_text("متأسفانه این دستور پخت یافت نشد.")
             
-    except Exception as e:
-        print(f"Error in view_recipe_details: {e}")
+    except Exception:
+        logger.exception("Error in view_recipe_details")
         await query.message.reply_text("خطا در نمایش اطلاعات. لطفاً دوباره تلاش کنید.")
 
+# Inline mode answers one page at a time, newest recipes first;
+# next_offset is the id of the last result sent
+INLINE_PAGE_SIZE = 20
+# Results do not depend on who asks, so Telegram may share them between users
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '30'))
+# Pages by (normalized query, offset); typing a query repeats its prefixes
+inline_results_cache = TTLCache(maxsize=2000, ttl=float(os.getenv('INLINE_RESULTS_TTL', '30')))
+
+def _inline_article(row: tuple) -> InlineQueryResultArticle:
+    recipe_id, title, _, cooking_time, skill_level, calories = row[:6]
+    return render_cache.get(recipe_id, row[10], 'inline', lambda: _build_inline_article(
+        recipe_id, title, cooking_time, skill_level, calories
+    ))
+
+def _build_inline_article(recipe_id, title, cooking_time, skill_level, calories) -> InlineQueryResultArticle:
+    preview_content = (
+        f"🍳 {title}\n"
+        f"⏱ زمان پخت: {cooking_time} دقیقه\n"
+        f"📊 سطح دشواری: {skill_level}\n"
+        f"🔥 کالری: {calories}"
+    )
+    return InlineQueryResultArticle(
+        id=str(recipe_id),
+        title=title,
+        description=f"زمان پخت: {cooking_time} دقیقه | کالری: {calories}",
+        input_message_content=InputTextMessageContent(message_text=preview_content),
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("مشاهده کامل", 
+                               switch_inline_query_current_chat=f"receipt_full:{recipe_id}")
+        ]])
+    )
+
+async def _inline_page(term: str, offset: str):
+    """Results and next_offset for one inline page; an empty query lists the newest recipes"""
+    after_id = int(offset) if offset else None
+    rows = await db.get_latest_recipes(term, limit=INLINE_PAGE_SIZE, after_id=after_id)
+    next_offset = str(rows[-1][0]) if len(rows) == INLINE_PAGE_SIZE else ""
+    return [_inline_article(row) for row in rows], next_offset
+
 @require_auth
 async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.inline_query.query
-    user_id = update.inline_query.from_user.id
+    inline = update.inline_query
+    query = inline.query
     
     results = []
     
@@ -226,7 +281,7 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if query.startswith('receipt_full:'):
         try:
             recipe_id = int(query.split(':')[1])
-            recipe = db.get_recipe_details(recipe_id)
+            recipe = await db.get_recipe_details(recipe_id)
             
             if recipe:
                 full_content = (
@@ -255,61 +310,43 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
         except (ValueError, IndexError):
             pass
-    else:
-        # Regular recipe list
-        recipes = db.get_user_recipes(user_id)
-        for recipe in recipes:
-            recipe_id, title, cooking_time, skill_level, calories, created_at = recipe
-            
-            if not query or query.lower() in title.lower():
-                preview_content = (
-                    f"🍳 {title}\n"
-                    f"⏱ زمان پخت: {cooking_time} دقیقه\n"
-                    f"📊 سطح دشواری: {skill_level}\n"
-                    f"🔥 کالری: {calories}"
-                )
-                
-                results.append(
-                    InlineQueryResultArticle(
-                        id=str(recipe_id),
-                        title=title,
-                        description=f"زمان پخت: {cooking_time} دقیقه | کالری: {calories}",
-                        input_message_content=InputTextMessageContent(
-                            message_text=preview_content,
-                            parse_mode='HTML'
-                        ),
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("مشاهده کامل", 
-                                               switch_inline_query_current_chat=f"receipt_full:{recipe_id}")
-                        ]])
-                    )
-                )
+        await inline.answer(results, cache_time=INLINE_CACHE_TIME)
+        return
     
-    await update.inline_query.answer(results)
+    term = normalize_text(query)
+    page = inline_results_cache.get((term, inline.offset))
+    if page is None:
+        try:
+            page = await _inline_page(term, inline.offset)
+        except ValueError:
+            page = ([], "")  # Offset not produced by us
+        inline_results_cache.set((term, inline.offset), page)
+    
+    results, next_offset = page
+    await inline.answer(results, next_offset=next_offset, cache_time=INLINE_CACHE_TIME, is_personal=False)
 
 # Add new handler for media viewing
 async def view_recipe_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        print('view_recipe_media', update)
         query = update.callback_query
         await query.answer()
         
         recipe_id = int(query.data.split('_')[2])
-        recipe = db.get_recipe_details(recipe_id)
+        recipe = await db.get_recipe_details(recipe_id)
         
-        print('retrive recipe', recipe)
-        # Use query.chat_instance instead of query.message.chat.id
-        chat_id = query.chat_instance
-        print('chat_id', chat_id)
+        # Buttons on inline messages come without a message; answer in the user's private chat
+        chat_id = query.message.chat.id if query.message else query.from_user.id
+        logger.debug("Sending recipe media", extra={'recipe_id': recipe_id, 'chat_id': chat_id, 'found': bool(recipe)})
         if recipe and chat_id:
             # Send photo if available
-            if recipe['image_path']:
+            if recipe['image_path'] or recipe['image_file_id']:
                 try:
-                    with open(recipe['image_path'], 'rb') as photo:
-                        await context.bot.send_photo(
-                            chat_id=chat_id,
-                            photo=photo
-                        )
+                    await send_cached_media(
+                        context.bot.send_photo, 'photo',
+                        recipe['image_file_id'], recipe['image_path'],
+                        lambda file_id: db.set_recipe_file_id(recipe_id, 'photo', file_id),
+                        chat_id=chat_id
+                    )
                 except Exception as e:
                     await context.bot.send_message(
                         chat_id=chat_id,
@@ -317,20 +354,21 @@ async def view_recipe_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     )
             
             # Send voice instruction if available
-            if recipe['instruction_voice']:
+            if recipe['instruction_voice'] or recipe['voice_file_id']:
                 try:
-                    with open(recipe['instruction_voice'], 'rb') as voice:
-                        await context.bot.send_voice(
-                            chat_id=chat_id,
-                            voice=voice
-                        )
+                    await send_cached_media(
+                        context.bot.send_voice, 'voice',
+                        recipe['voice_file_id'], recipe['instruction_voice'],
+                        lambda file_id: db.set_recipe_file_id(recipe_id, 'voice', file_id),
+                        chat_id=chat_id
+                    )
                 except Exception as e:
                     await context.bot.send_message(
                         chat_id=chat_id,
                         text="(فایل صوتی در دسترس نیست)"
                     )
-    except Exception as e:
-        print(f"Error in view_recipe_media: {e}")
+    except Exception:
+        logger.exception("Error in view_recipe_media")
         if query.message and query.message.chat:
             await context.bot.send_message(
                 chat_id=query.message.chat.id,
@@ -338,66 +376,19 @@ async def view_recipe_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
 
 async def start_recipe_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    print("\n=== Starting Recipe Edit ===")
     query = update.callback_query
     await query.answer()
-    print('query.data', query.data)
     recipe_id = int(query.data.split('_')[2])
-    recipe = db.get_recipe_details(recipe_id)
-    print(f"Recipe ID: {recipe_id}")
-    print(f"Recipe data: {recipe}")
+    recipe = await db.get_recipe_details(recipe_id)
+    logger.debug("Starting recipe edit", extra={'recipe_id': recipe_id, 'user_id': update.effective_user.id, 'found': bool(recipe)})
     
     if recipe:
         context.user_data['editing_recipe_id'] = recipe_id
         context.user_data['original_recipe'] = recipe
-        print(f"Stored in context: {context.user_data}")
-        
-        keyboard = [
-            [InlineKeyboardButton("عنوان", callback_data=f"edit_{recipe_id}_title"),
-             InlineKeyboardButton("مواد لازم", callback_data=f"edit_{recipe_id}_ingredients")],
-            [InlineKeyboardButton("زمان پخت", callback_data=f"edit_{recipe_id}_time"),
-             InlineKeyboardButton("سطح دشواری", callback_data=f"edit_{recipe_id}_level")],
-            [InlineKeyboardButton("کالری", callback_data=f"edit_{recipe_id}_calories"),
-             InlineKeyboardButton("دستور پخت", callback_data=f"edit_{recipe_id}_instructions")],
-        ]
-        
-        # Add photo buttons if photo exists
-        if recipe.get('image_path'):
-            keyboard.append([
-                InlineKeyboardButton("🔄 تغییر عکس", callback_data=f"edit_{recipe_id}_photo"),
-                InlineKeyboardButton("❌ حذف عکس", callback_data=f"edit_{recipe_id}_remove_photo")
-            ])
-        else:
-            keyboard.append([
-                InlineKeyboardButton("➕ افزودن عکس", callback_data=f"edit_{recipe_id}_photo")
-            ])
-        
-        # Add voice buttons if voice exists
-        if recipe.get('instruction_voice'):
-            keyboard.append([
-                InlineKeyboardButton("🔄 تغییر صدا", callback_data=f"edit_{recipe_id}_voice"),
-                InlineKeyboardButton("❌ حذف صدا", callback_data=f"edit_{recipe_id}_remove_voice")
-            ])
-        else:
-            keyboard.append([
-                InlineKeyboardButton("➕ افزودن صدا", callback_data=f"edit_{recipe_id}_voice")
-            ])
-            
-        keyboard.append([InlineKeyboardButton("❌ انصراف", callback_data=f"edit_{recipe_id}_cancel")])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.message.reply_text(
-            "چه بخشی از دستور پخت را می‌خواهید ویرایش کنید؟",
-            reply_markup=reply_markup
-        )
-        print("Returning to WAITING state")
-        return EDIT_WAITING
-    print("Recipe not found, ending conversation")
+        return await show_edit_menu(recipe, query.message)
     return ConversationHandler.END
 
 async def handle_edit_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    print("\n=== Handling Edit Selection ===")
     query = update.callback_query
     await query.answer()
     
@@ -405,50 +396,39 @@ async def handle_edit_selection(update: Update, context: ContextTypes.DEFAULT_TY
     parts = query.data.split('_')
     recipe_id = int(parts[1])
     selection = '_'.join(parts[2:])  # Join remaining parts to handle 'remove_photo' and 'remove_voice'
-    print(f"Edit selection: recipe_id={recipe_id}, selection={selection}")
+    logger.debug("Edit selection", extra={'recipe_id': recipe_id, 'selection': selection, 'user_id': update.effective_user.id})
     
     if selection == 'cancel':
         await query.message.reply_text("ویرایش لغو شد.")
-        print("Edit cancelled")
         return ConversationHandler.END
         
     if selection in ['remove_photo', 'remove_voice']:
         try:
-            recipe = db.get_recipe_details(recipe_id)
-            if not recipe:
-                await query.message.reply_text("خطا در دریافت اطلاعات دستور پخت.")
-                return ConversationHandler.END
-            
             if selection == 'remove_photo':
-                if recipe.get('image_path') and os.path.exists(recipe['image_path']):
-                    os.remove(recipe['image_path'])
-                recipe['image_path'] = None
+                media = 'photo'
                 success_message = "عکس با موفقیت حذف شد! ✅"
             else:  # remove_voice
-                if recipe.get('instruction_voice') and os.path.exists(recipe['instruction_voice']):
-                    os.remove(recipe['instruction_voice'])
-                recipe['instruction_voice'] = None
+                media = 'voice'
                 success_message = "صدا با موفقیت حذف شد! ✅"
             
-            if db.update_recipe(recipe_id, update.effective_user.id, recipe):
+            if await db.replace_recipe_media(recipe_id, update.effective_user.id, media, None):
                 await query.message.reply_text(success_message)
             else:
                 await query.message.reply_text("خطا در حذف. لطفاً دوباره تلاش کنید.")
-        except Exception as e:
-            print(f"Error removing media: {e}")
+        except Exception:
+            logger.exception("Error removing media")
             await query.message.reply_text("خطا در حذف. لطفاً دوباره تلاش کنید.")
         return ConversationHandler.END
     
     # Store recipe_id in context
     context.user_data['editing_recipe_id'] = recipe_id
-    recipe = db.get_recipe_details(recipe_id)
+    recipe = await db.get_recipe_details(recipe_id)
     if not recipe:
         await query.message.reply_text("خطا در دریافت اطلاعات دستور پخت.")
-        print(f"Recipe {recipe_id} not found")
+        logger.warning("Recipe %s not found for editing", recipe_id)
         return ConversationHandler.END
         
     context.user_data['original_recipe'] = recipe
-    print(f"Stored recipe in context: {recipe}")
     
     prompts = {
         'title': "عنوان جدید را وارد کنید:",
@@ -473,11 +453,10 @@ async def handle_edit_selection(update: Update, context: ContextTypes.DEFAULT_TY
     }
     
     next_state = state_map.get(selection)
-    print(f"Next state: {next_state}")
     
     if next_state is None:
         await query.message.reply_text("گزینه نامعتبر.")
-        print(f"Invalid selection: {selection}")
+        logger.warning("Invalid edit selection: %s", selection)
         return ConversationHandler.END
     
     if selection == 'level':
@@ -491,18 +470,13 @@ async def handle_edit_selection(update: Update, context: ContextTypes.DEFAULT_TY
     context.chat_data['recipe_edit'] = next_state
     context.chat_data['editing_recipe_id'] = recipe_id
     context.chat_data['original_recipe'] = recipe
-    print(f"Transitioning to state: {next_state}")
     return next_state
 
 # Add these handlers after handle_edit_selection
 
-async def show_edit_menu(recipe_id: int, message) -> int:
-    """Helper function to show the edit menu"""
-    recipe = db.get_recipe_details(recipe_id)
-    if not recipe:
-        await message.reply_text("خطا در دریافت اطلاعات دستور پخت.")
-        return ConversationHandler.END
-    
+async def show_edit_menu(recipe: dict, message) -> int:
+    """Show the edit menu for a recipe as returned by patch_recipe or get_recipe_details"""
+    recipe_id = recipe['id']
     keyboard = [
         [InlineKeyboardButton("عنوان", callback_data=f"edit_{recipe_id}_title"),
          InlineKeyboardButton("مواد لازم", callback_data=f"edit_{recipe_id}_ingredients")],
@@ -513,7 +487,7 @@ async def show_edit_menu(recipe_id: int, message) -> int:
     ]
     
     # Add photo buttons if photo exists
-    if recipe.get('image_path'):
+    if recipe.get('image_path') or recipe.get('image_file_id'):
         keyboard.append([
             InlineKeyboardButton("🔄 تغییر عکس", callback_data=f"edit_{recipe_id}_photo"),
             InlineKeyboardButton("❌ حذف عکس", callback_data=f"edit_{recipe_id}_remove_photo")
@@ -524,7 +498,7 @@ async def show_edit_menu(recipe_id: int, message) -> int:
         ])
     
     # Add voice buttons if voice exists
-    if recipe.get('instruction_voice'):
+    if recipe.get('instruction_voice') or recipe.get('voice_file_id'):
         keyboard.append([
             InlineKeyboardButton("🔄 تغییر صدا", callback_data=f"edit_{recipe_id}_voice"),
             InlineKeyboardButton("❌ حذف صدا", callback_data=f"edit_{recipe_id}_remove_voice")
@@ -552,11 +526,11 @@ async def edit_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
         return ConversationHandler.END
     
-    recipe['title'] = update.message.text
-    
-    if db.update_recipe(recipe_id, update.effective_user.id, recipe):
+    recipe = await db.patch_recipe(recipe_id, update.effective_user.id, title=update.message.text)
+    if recipe:
+        context.user_data['original_recipe'] = recipe
         await update.message.reply_text("عنوان با موفقیت ویرایش شد! ✅")
-        return await show_edit_menu(recipe_id, update.message)
+        return await show_edit_menu(recipe, update.message)
     else:
         await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
         return ConversationHandler.END
@@ -569,11 +543,11 @@ async def edit_ingredients(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
         return ConversationHandler.END
     
-    recipe['ingredients'] = update.message.text
-    
-    if db.update_recipe(recipe_id, update.effective_user.id, recipe):
+    recipe = await db.patch_recipe(recipe_id, update.effective_user.id, ingredients=update.message.text)
+    if recipe:
+        context.user_data['original_recipe'] = recipe
         await update.message.reply_text("مواد لازم با موفقیت ویرایش شد! ✅")
-        return await show_edit_menu(recipe_id, update.message)
+        return await show_edit_menu(recipe, update.message)
     else:
         await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
         return ConversationHandler.END
@@ -594,15 +568,15 @@ async def edit_cooking_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("لطفاً یک عدد معتبر وارد کنید.")
             return EDIT_COOKING_TIME
             
-        recipe['cooking_time'] = new_time
-        
-        if db.update_recipe(recipe_id, update.effective_user.id, recipe):
+        recipe = await db.patch_recipe(recipe_id, update.effective_user.id, cooking_time=new_time)
+        if recipe:
+            context.user_data['original_recipe'] = recipe
             await update.message.reply_text("زمان پخت با موفقیت ویرایش شد! ✅")
-            return await show_edit_menu(recipe_id, update.message)
+            return await show_edit_menu(recipe, update.message)
         else:
             await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
-    except Exception as e:
-        print(f"Error updating recipe: {e}")
+    except Exception:
+        logger.exception("Error updating recipe")
         await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
     
     return ConversationHandler.END
@@ -615,11 +589,11 @@ async def edit_skill_level(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
         return ConversationHandler.END
     
-    recipe['skill_level'] = update.message.text
-    
-    if db.update_recipe(recipe_id, update.effective_user.id, recipe):
+    recipe = await db.patch_recipe(recipe_id, update.effective_user.id, skill_level=update.message.text)
+    if recipe:
+        context.user_data['original_recipe'] = recipe
         await update.message.reply_text("سطح دشواری با موفقیت ویرایش شد! ✅")
-        return await show_edit_menu(recipe_id, update.message)
+        return await show_edit_menu(recipe, update.message)
     else:
         await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
         return ConversationHandler.END
@@ -634,11 +608,11 @@ async def edit_calories(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         calories = int(update.message.text)
-        recipe['calories'] = calories
-        
-        if db.update_recipe(recipe_id, update.effective_user.id, recipe):
+        recipe = await db.patch_recipe(recipe_id, update.effective_user.id, calories=calories)
+        if recipe:
+            context.user_data['original_recipe'] = recipe
             await update.message.reply_text("کالری با موفقیت ویرایش شد! ✅")
-            return await show_edit_menu(recipe_id, update.message)
+            return await show_edit_menu(recipe, update.message)
         else:
             await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
     except ValueError:
@@ -655,11 +629,11 @@ async def edit_instructions(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
         return ConversationHandler.END
     
-    recipe['instructions'] = update.message.text
-    
-    if db.update_recipe(recipe_id, update.effective_user.id, recipe):
+    recipe = await db.patch_recipe(recipe_id, update.effective_user.id, instructions=update.message.text)
+    if recipe:
+        context.user_data['original_recipe'] = recipe
         await update.message.reply_text("دستور پخت با موفقیت ویرایش شد! ✅")
-        return await show_edit_menu(recipe_id, update.message)
+        return await show_edit_menu(recipe, update.message)
     else:
         await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
         return ConversationHandler.END
@@ -673,27 +647,19 @@ async def edit_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     
     try:
-        if not os.path.exists('photos'):
-            os.makedirs('photos')
-        
-        # Remove old photo if exists
-        if recipe.get('image_path') and os.path.exists(recipe['image_path']):
-            os.remove(recipe['image_path'])
-        
         photo = update.message.photo[-1]
-        image_path = f"photos/{photo.file_id}.jpg"
-        file = await context.bot.get_file(photo.file_id)
-        await file.download_to_drive(image_path)
-        
-        recipe['image_path'] = image_path
         
-        if db.update_recipe(recipe_id, update.effective_user.id, recipe):
+        # Sent by file_id until the background download reaches the media store
+        recipe = await db.replace_recipe_media(recipe_id, update.effective_user.id, 'photo', photo.file_id)
+        if recipe:
+            context.user_data['original_recipe'] = recipe
+            media_pipeline.attach(context.bot, recipe_id, 'photo', photo.file_id)
             await update.message.reply_text("عکس با موفقیت ویرایش شد! ✅")
-            return await show_edit_menu(recipe_id, update.message)
+            return await show_edit_menu(recipe, update.message)
         else:
             await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
-    except Exception as e:
-        print(f"Error updating photo: {e}")
+    except Exception:
+        logger.exception("Error updating photo")
         await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش ��نید.")
     
     return ConversationHandler.END
@@ -707,27 +673,18 @@ async def edit_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     
     try:
-        if not os.path.exists('voices'):
-            os.makedirs('voices')
-        
-        # Remove old voice if exists
-        if recipe.get('instruction_voice') and os.path.exists(recipe['instruction_voice']):
-            os.remove(recipe['instruction_voice'])
-        
         voice = update.message.voice
-        voice_path = f"voices/{voice.file_id}.ogg"
-        file = await context.bot.get_file(voice.file_id)
-        await file.download_to_drive(voice_path)
         
-        recipe['instruction_voice'] = voice_path
-        
-        if db.update_recipe(recipe_id, update.effective_user.id, recipe):
+        recipe = await db.replace_recipe_media(recipe_id, update.effective_user.id, 'voice', voice.file_id)
+        if recipe:
+            context.user_data['original_recipe'] = recipe
+            media_pipeline.attach(context.bot, recipe_id, 'voice', voice.file_id)
             await update.message.reply_text("صدا با موفقیت ویرایش شد! ✅")
-            return await show_edit_menu(recipe_id, update.message)
+            return await show_edit_menu(recipe, update.message)
         else:
             await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
-    except Exception as e:
-        print(f"Error updating voice: {e}")
+    except Exception:
+        logger.exception("Error updating voice")
         await update.message.reply_text("خطا در ویرایش. لطفاً دوباره تلاش کنید.")
     
     return ConversationHandler.END
@@ -748,30 +705,20 @@ async def handle_remove_media(update: Update, context: ContextTypes.DEFAULT_TYPE
     recipe_id = int(parts[1])
     media_type = parts[3]  # 'photo' or 'voice'
     
-    recipe = db.get_recipe_details(recipe_id)
-    if not recipe:
-        await query.message.reply_text("خطا در دریافت اطلاعات دستور پخت.")
-        return ConversationHandler.END
-    
     try:
         if media_type == 'photo':
-            if recipe.get('image_path') and os.path.exists(recipe['image_path']):
-                os.remove(recipe['image_path'])
-            recipe['image_path'] = None
             success_message = "عکس با موفقیت حذف شد! ✅"
         else:  # voice
-            if recipe.get('instruction_voice') and os.path.exists(recipe['instruction_voice']):
-                os.remove(recipe['instruction_voice'])
-            recipe['instruction_voice'] = None
             success_message = "صدا با موفقیت حذف شد! ✅"
         
-        if db.update_recipe(recipe_id, update.effective_user.id, recipe):
+        recipe = await db.replace_recipe_media(recipe_id, update.effective_user.id, media_type, None)
+        if recipe:
             await query.message.reply_text(success_message)
-            return await show_edit_menu(recipe_id, query.message)
+            return await show_edit_menu(recipe, query.message)
         else:
             await query.message.reply_text("خطا در حذف. لطفاً دوباره تلاش کنید.")
-    except Exception as e:
-        print(f"Error removing media: {e}")
+    except Exception:
+        logger.exception("Error removing media")
         await query.message.reply_text("خطا در حذف. لطفاً دوباره تلاش کنید.")
     
     return ConversationHandler.END
@@ -788,60 +735,76 @@ async def search_recipes_start(update: Update, context: ContextTypes.DEFAULT_TYP
     )
     return SEARCH_QUERY
 
+def _render_search_result(number: int, result: tuple):
+    (recipe_id, title, ingredients, cooking_time, skill_level, calories,
+     image_path, owner_id, owner_username, image_file_id, position,
+     image_preview_path, image_preview_file_id, updated_at) = result
+    
+    # Preview block with the first 100 chars of ingredients
+    card = render_cache.get(recipe_id, updated_at, 'search', lambda: (
+        f"🍳 {title}\n"
+        f"👨‍🍳 آشپز: {owner_username or 'ناشناس'}\n"
+        f"⏱ زمان پخت: {cooking_time} دقیقه\n"
+        f"📊 سطح دشواری: {skill_level}\n"
+        f"🔥 کالری: {calories}\n"
+        f"📝 مواد لازم: {ingredients[:100]}..."
+    ))
+    return f"{number}. {card}", recipe_id
+
+async def _fetch_search_results(params: dict, cursor, limit: int):
+    # params['ids'] is the search ranked once when it was run; the cursor is
+    # the id of the last recipe shown
+    ids = params.get('ids')
+    if ids is None:
+        return []  # A list from before searches were ranked once
+    start = ids.index(cursor[0]) + 1 if cursor else 0
+    return await db.get_search_results(ids[start:start + limit])
+
+# 'media_group' sends the photos of each result page as one media group
+# followed by the index message; 'carousel' sends the index message only.
+SEARCH_RESULTS_MODE = os.getenv('SEARCH_RESULTS_MODE', 'media_group')
+
+def _listing_photo(result: tuple):
+    """(file_id, path) of the photo a listing sends: the preview when one was generated"""
+    if result[11]:
+        return result[12], result[11]
+    if result[9] or result[6]:
+        return result[9], result[6]
+    return None
+
+_search_media_mode = dict(
+    page_size=10,
+    photo_of=_listing_photo,
+    on_new_file_id=db.set_listing_photo_file_id
+) if SEARCH_RESULTS_MODE == 'media_group' else {}
+
+register_pager('search', PagerSource(
+    fetch=_fetch_search_results,
+    cursor_of=lambda result: (result[0],),
+    render_item=_render_search_result,
+    header=lambda params: f"🔍 نتایج جستجو برای «{params['term']}»:",
+    empty_text=(
+        "🔍 نتیجه‌ای یافت نشد!\n"
+        "می‌توانید با عبارت دیگری جستجو کنید یا از /cancel برای خروج استفاده کنید."
+    ),
+    marked=lambda params: db.get_favorite_ids(params['user_id']),
+    **_search_media_mode
+))
+
 async def search_recipes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     search_term = update.message.text
     if len(search_term) < 2:
         await update.message.reply_text("لطفاً حداقل ۲ حرف وارد کنید.")
         return SEARCH_QUERY
     
-    results = db.search_recipes(search_term)
-    
-    if not results:
-        await update.message.reply_text(
-            "🔍 نتیجه‌ای یافت نشد!\n"
-            "می‌توانید با عبارت دیگری جستجو کنید یا از /cancel برای خروج استفاده کنید."
-        )
+    params = {
+        'term': search_term,
+        'user_id': update.effective_user.id,
+        'ids': await db.search_recipe_ids(search_term),
+    }
+    if not await send_pager(update.message, context, 'search', params):
         return SEARCH_QUERY
     
-    await update.message.reply_text(f"🔍 {len(results)} نتیجه یافت شد:")
-    
-    for result in results:
-        recipe_id, title, ingredients, cooking_time, skill_level, calories, image_path, owner_id, owner_username = result
-        
-        # Create preview message
-        message = (
-            f"🍳 {title}\n"
-            f"👨‍🍳 آشپز: {owner_username or 'ناشناس'}\n"
-            f"⏱ زمان پخت: {cooking_time} دقیقه\n"
-            f"📊 سطح دشواری: {skill_level}\n"
-            f"🔥 کالری: {calories}\n\n"
-            f"📝 مواد لازم:\n{ingredients[:100]}..."  # Show first 100 chars of ingredients
-        )
-        
-        # Add view button
-        keyboard = [[InlineKeyboardButton("👁 مشاهده کامل", callback_data=f"view_recipe_{recipe_id}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # Send message with photo if available
-        if image_path and os.path.exists(image_path):
-            try:
-                with open(image_path, 'rb') as photo:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=message,
-                        reply_markup=reply_markup
-                    )
-            except Exception as e:
-                await update.message.reply_text(
-                    message,
-                    reply_markup=reply_markup
-                )
-        else:
-            await update.message.reply_text(
-                message,
-                reply_markup=reply_markup
-            )
-    
     await update.message.reply_text(
         "می‌توانید عبارت جدیدی جستجو کنید یا از /cancel برای خروج استفاده کنید."
     )
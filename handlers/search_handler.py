@@ -1,9 +1,9 @@
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
-from database.db_operations import DatabaseManager
+from database.async_db import AsyncDatabaseManager
 
 # Initialize database manager
-db = DatabaseManager()
+db = AsyncDatabaseManager()
 
 # States for search conversation
 SEARCH_QUERY = 0
@@ -14,7 +14,7 @@ async def search_recipes_start(update: Update, context: ContextTypes.DEFAULT_TYP
 
 async def search_recipes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     search_term = update.message.text
-    results = db.search_recipes(search_term)
+    results = await db.search_recipes(search_term)
     
     if not results:
         await update.message.reply_text("هیچ دستور پختی یافت نشد.")
@@ -0,0 +1,46 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from handlers.auth_handler import admin_only
+from utils.loop_monitor import loop_monitor
+from utils.metrics import metrics
+from utils.outbound import outbound_scheduler
+
+# Rows shown per section of /stats
+STATS_TOP = 5
+
+def _top_lines(name: str, by_total: bool = False) -> list:
+    """The busiest series of a histogram, one line each: calls, p50 and p95 in ms"""
+    series = metrics.histograms(name)
+    key = (lambda item: item[1].sum) if by_total else (lambda item: item[1].count)
+    lines = []
+    for labels, histogram in sorted(series.items(), key=key, reverse=True)[:STATS_TOP]:
+        label = dict(labels)
+        label = label.get('handler') or label.get('method')
+        lines.append(
+            f"• {label}: {histogram.count} بار، "
+            f"p50 {histogram.quantile(0.5) * 1000:.1f} ms، p95 {histogram.quantile(0.95) * 1000:.1f} ms"
+        )
+    return lines or ["• هنوز داده‌ای ثبت نشده"]
+
+@admin_only
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    lag = loop_monitor.snapshot()
+    outbound = outbound_scheduler.snapshot()
+    errors = sum(metrics.counters('bot_handler_errors_total').values())
+    lines = [
+        "📊 آمار عملکرد ربات",
+        "",
+        "⏱ پرکاربردترین دستورها:",
+        *_top_lines('bot_handler_seconds'),
+        "",
+        "🗄 پرهزینه‌ترین کوئری‌های پایگاه داده:",
+        *_top_lines('db_query_seconds', by_total=True),
+        "",
+        "📡 فراخوانی‌های Bot API:",
+        *_top_lines('bot_api_seconds'),
+        "",
+        f"⚠️ خطای دستورها: {errors:g}",
+        f"🔁 تأخیر حلقه رویداد: میانگین {lag['avg_lag_ms']:.1f} ms، بیشینه {lag['max_lag_ms']:.1f} ms",
+        f"📤 پیام‌های ارسال‌شده: {outbound['sent']}، تلاش مجدد: {outbound['retries']}، ناموفق: {outbound['failures']}",
+    ]
+    await update.message.reply_text("\n".join(lines))
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# Named caches by name. When the bot runs as several worker processes
+# (utils/workers.py), invalidate() on a named cache is reported to the
+# listener so the other processes can drop the key too.
+_named_caches: Dict[str, 'TTLCache'] = {}
+_invalidation_listener: Optional[Callable[[str, Any], None]] = None
+
+def set_invalidation_listener(listener: Optional[Callable[[str, Any], None]]):
+    global _invalidation_listener
+    _invalidation_listener = listener
+
+def apply_invalidation(name: str, key):
+    """Drop a key that another process invalidated, without reporting it again"""
+    cache = _named_caches.get(name)
+    if cache is not None:
+        cache._discard(key)
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after `ttl` seconds.
+
+    Safe to share between the event loop and DB executor threads. A value
+    loaded from the database should be stored with the generation() taken
+    before the load: if the key was invalidated in the meantime the load may
+    have read the old row, and set() drops it.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, name: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Generation of each key's last invalidation, for the most recent
+        # maxsize keys; older ones count as invalidated at _forgotten
+        self._generation = 0
+        self._invalidated = OrderedDict()
+        self._forgotten = 0
+        if name is not None:
+            _named_caches[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def generation(self) -> int:
+        """A token to pass to set() for a value about to be loaded"""
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, generation: Optional[int] = None) -> bool:
+        """Store a value; with `generation`, only if the key was not invalidated since"""
+        with self._lock:
+            if generation is not None and max(self._forgotten, self._invalidated.get(key, 0)) > generation:
+                return False
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def invalidate(self, key):
+        self._discard(key)
+        if self.name is not None and _invalidation_listener is not None:
+            _invalidation_listener(self.name, key)
+
+    def _discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._generation += 1
+            self._invalidated[key] = self._generation
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.maxsize:
+                _, self._forgotten = self._invalidated.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+            self._invalidated.clear()
+            self._forgotten = self._generation
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'hit_rate': self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,61 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; listings then send the original photo
+    Image = None
+
+# Listings show photos at chat-bubble size; this is plenty and a fraction of photo[-1]
+PREVIEW_MAX_SIDE = int(os.getenv('PREVIEW_MAX_SIDE', '512'))
+PREVIEW_QUALITY = int(os.getenv('PREVIEW_QUALITY', '70'))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def render_preview(path: str, max_side: int = PREVIEW_MAX_SIDE, quality: int = PREVIEW_QUALITY) -> bytes:
+    """Downscaled, recompressed JPEG of an image file. Runs in a worker process."""
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image.thumbnail((max_side, max_side))
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+        return buffer.getvalue()
+
+def previews_enabled() -> bool:
+    return Image is not None
+
+async def generate_preview(path: str) -> Optional[bytes]:
+    """Preview JPEG bytes for a stored photo, or None without Pillow or on a bad image.
+
+    Decoding and resizing are CPU-bound, so they run in a process pool
+    instead of blocking the event loop or holding the GIL in DB threads.
+    """
+    global _executor
+    if Image is None:
+        return None
+    if _executor is None:
+        # Not forked from the bot, whose event loop, DB writer and logging
+        # threads would be copied mid-state into every child
+        _executor = ProcessPoolExecutor(
+            max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context('forkserver')
+        )
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_executor, render_preview, path)
+    except Exception:
+        logger.exception("Error generating preview for %s", path)
+        return None
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
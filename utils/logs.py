@@ -0,0 +1,132 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Optional
+
+# JSON lines, rotated at LOG_MAX_BYTES with LOG_BACKUPS old files kept
+LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv('LOG_BACKUPS', '5'))
+# Fraction of DEBUG records kept; the edit and media flows log on every button press
+LOG_DEBUG_SAMPLE = float(os.getenv('LOG_DEBUG_SAMPLE', '0.1'))
+
+# Attributes every LogRecord has; anything else was passed in `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+class ConsoleFormatter(logging.Formatter):
+    """Plain text with the `extra` fields appended as key=value"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        extra = ' '.join(f"{key}={value}" for key, value in _extra_fields(record).items())
+        return f"{text} {extra}" if extra else text
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the `extra` fields next to the message"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class DebugSampler(logging.Filter):
+    """Keeps a random `rate` of DEBUG records and tags them with it, so counts can be scaled back up"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.DEBUG or self.rate >= 1:
+            return True
+        if random.random() >= self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() formats the record on the calling thread with
+        # this handler's formatter; only resolve the message and traceback
+        # here, the listener's handlers do the formatting.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class _WorkerTag(logging.Filter):
+    def __init__(self, index: int):
+        super().__init__()
+        self.index = index
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.worker = self.index
+        return True
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging(log_file: str = LOG_FILE, level: str = LOG_LEVEL, worker: Optional[int] = None):
+    """Send all logging through a queue to bot.log (JSON) and stderr.
+
+    Loggers only put records on an unbounded queue; a listener thread does
+    the formatting and file I/O, so no handler waits on the disk. Worker
+    processes each write their own file, bot.worker<N>.log, since rotation
+    cannot be shared between processes.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    if worker is not None:
+        base, ext = os.path.splitext(log_file)
+        log_file = f"{base}.worker{worker}{ext}"
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8'
+    )
+    file_handler.setFormatter(JsonFormatter())
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(ConsoleFormatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE))
+    if worker is not None:
+        queue_handler.addFilter(_WorkerTag(worker))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers = [queue_handler]
+    # A line per Bot API request
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Write out what is still queued"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
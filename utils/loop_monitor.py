@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class LoopLagMonitor:
+    """Measures how long the event loop is blocked.
+
+    A background task sleeps for `interval` seconds and records how much later
+    than requested it actually woke up. Any lag means some callback held the
+    loop for that long.
+    """
+
+    def __init__(self, interval: float = 0.1, warn_threshold: float = 0.1):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.samples = 0
+        self.stalls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+            self.samples += 1
+            if lag >= self.warn_threshold:
+                self.stalls += 1
+                logger.warning("Event loop blocked for %.0f ms", lag * 1000)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {
+            'last_lag_ms': self.last_lag * 1000,
+            'max_lag_ms': self.max_lag * 1000,
+            'avg_lag_ms': (self.total_lag / self.samples * 1000) if self.samples else 0.0,
+            'stalls': self.stalls,
+            'samples': self.samples,
+        }
+
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple
+from telegram import InputMediaPhoto, Message
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+# Uploads from disk in flight at once; each holds its file's bytes in memory
+MEDIA_UPLOAD_CONCURRENCY = int(os.getenv('MEDIA_UPLOAD_CONCURRENCY', '4'))
+_upload_slots = asyncio.Semaphore(MEDIA_UPLOAD_CONCURRENCY)
+
+def _read_file(path: Optional[str]) -> Optional[bytes]:
+    if not path:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def sent_file_id(message: Message) -> Optional[str]:
+    """Telegram file_id of the photo or voice carried by a sent message"""
+    if message.photo:
+        return message.photo[-1].file_id
+    if message.voice:
+        return message.voice.file_id
+    return None
+
+async def send_cached_media(
+    send: Callable[..., Awaitable[Message]],
+    media: str,
+    file_id: Optional[str],
+    path: Optional[str],
+    on_new_file_id: Optional[Callable[[str], Awaitable]] = None,
+    **kwargs
+) -> Message:
+    """Send a photo or voice by Telegram file_id, uploading from disk only as a fallback.
+
+    `send` is a bound send method such as message.reply_photo and `media` is
+    its media argument name ('photo' or 'voice'). When the bytes have to be
+    uploaded, the file_id Telegram assigns is passed to `on_new_file_id` so
+    the next send is upload-free.
+    """
+    if file_id:
+        try:
+            return await send(**{media: file_id}, **kwargs)
+        except BadRequest as e:
+            # The id is unknown to this bot (e.g. the token changed); re-upload
+            logger.warning("Cached file_id rejected, uploading from disk: %s", e)
+
+    if not path:
+        raise FileNotFoundError(f"No file_id or file for {media}")
+
+    async with _upload_slots:
+        data = await asyncio.to_thread(_read_file, path)
+        if data is None:
+            raise FileNotFoundError(f"Cannot read {path}")
+        message = await send(**{media: data}, filename=os.path.basename(path), **kwargs)
+
+    new_file_id = sent_file_id(message)
+    if on_new_file_id and new_file_id and new_file_id != file_id:
+        await on_new_file_id(new_file_id)
+    return message
+
+async def _send_photo_group(message: Message, photos: list, use_file_ids: bool, on_new_file_id) -> List[Message]:
+    async with _upload_slots:
+        uploads = [
+            path for _, file_id, path, _ in photos
+            if not (use_file_ids and file_id)
+        ]
+        # Files are read on a worker thread, never on the event loop
+        contents = dict(zip(uploads, await asyncio.to_thread(lambda: [_read_file(p) for p in uploads])))
+
+        items = []
+        for recipe_id, file_id, path, caption in photos:
+            if use_file_ids and file_id:
+                items.append((recipe_id, False, file_id, None, caption))
+            elif contents.get(path) is not None:
+                items.append((recipe_id, True, contents[path], os.path.basename(path), caption))
+
+        if not items:
+            return []
+        if len(items) == 1:
+            # Media groups need at least two items
+            _, _, photo, filename, caption = items[0]
+            sent = [await message.reply_photo(photo, caption=caption, filename=filename)]
+        else:
+            sent = list(await message.reply_media_group([
+                InputMediaPhoto(photo, caption=caption, filename=filename)
+                for _, _, photo, filename, caption in items
+            ]))
+
+    if on_new_file_id:
+        for (recipe_id, uploaded, *_), sent_message in zip(items, sent):
+            if uploaded and sent_message.photo:
+                await on_new_file_id(recipe_id, sent_message.photo[-1].file_id)
+    return sent
+
+async def send_photo_group(
+    message: Message,
+    photos: List[Tuple[int, Optional[str], Optional[str], str]],
+    on_new_file_id: Optional[Callable[[int, str], Awaitable]] = None
+) -> List[Message]:
+    """Send up to 10 recipe photos as one media group in reply to `message`.
+
+    `photos` holds (recipe_id, file_id, path, caption) tuples. Stored file_ids
+    are used where available; photos without one are uploaded from disk and
+    their new file_id passed to `on_new_file_id(recipe_id, file_id)`.
+    """
+    try:
+        return await _send_photo_group(message, photos, True, on_new_file_id)
+    except BadRequest as e:
+        # One stale file_id fails the whole group; upload everything instead
+        logger.warning("Media group with cached file_ids rejected, uploading from disk: %s", e)
+        return await _send_photo_group(message, photos, False, on_new_file_id)
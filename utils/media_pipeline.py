@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+from telegram import Bot
+from utils.image_previews import generate_preview
+
+logger = logging.getLogger(__name__)
+
+class MediaPipeline:
+    """Downloads recipe media into the media store in the background.
+
+    attach() returns at once, so a conversation step never waits on a
+    download. The file is fetched in a task, written to the store off the
+    event loop and then linked to its recipe; until then the recipe is
+    served by its Telegram file_id. Stored photos then get a preview for
+    listings. Requests for a file_id that is already downloading share that
+    download.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._pending: Set[asyncio.Task] = set()
+
+    async def _download(self, bot: Bot, file_id: str, kind: str) -> Optional[str]:
+        file = await bot.get_file(file_id)
+        data = await file.download_as_bytearray()
+        return await self.db.store_media_bytes(bytes(data), kind)
+
+    async def fetch(self, bot: Bot, file_id: str, kind: str) -> Optional[str]:
+        """Stored path of a Telegram file, with one store reference owned by the caller"""
+        task = self._inflight.get(file_id)
+        if task is None:
+            task = asyncio.create_task(self._download(bot, file_id, kind))
+            self._inflight[file_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(file_id, None))
+            return await asyncio.shield(task)
+
+        # The download's own reference went to the caller that started it
+        path = await asyncio.shield(task)
+        if path and await self.db.retain_media(path):
+            return path
+        return None
+
+    async def _attach(self, bot: Bot, recipe_id: int, kind: str, file_id: str):
+        try:
+            path = await self.fetch(bot, file_id, kind)
+        except Exception:
+            logger.exception("Error downloading %s %s", kind, file_id)
+            return
+        if not path:
+            return
+        if not await self.db.set_recipe_media_path(recipe_id, kind, path, file_id):
+            # The recipe was deleted or its media replaced meanwhile
+            await self.db.release_media(path)
+            return
+        if kind == 'photo':
+            await self._add_preview(recipe_id, path)
+
+    async def _add_preview(self, recipe_id: int, image_path: str):
+        data = await generate_preview(image_path)
+        if not data:
+            return
+        preview_path = await self.db.store_media_bytes(data, 'preview')
+        if preview_path and not await self.db.set_recipe_preview(recipe_id, image_path, preview_path):
+            await self.db.release_media(preview_path)
+
+    def attach(self, bot: Bot, recipe_id: int, kind: str, file_id: str) -> asyncio.Task:
+        """Download a recipe's photo or voice and store its path on the recipe when done"""
+        task = asyncio.create_task(self._attach(bot, recipe_id, kind, file_id))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def drain(self):
+        """Wait for pending downloads, e.g. before shutdown"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
@@ -0,0 +1,264 @@
+import bisect
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from aiohttp import web
+from telegram.ext import BaseHandler, ConversationHandler
+
+logger = logging.getLogger(__name__)
+
+# Prometheus endpoint; METRICS_PORT=0 turns it off. With BOT_WORKERS > 1
+# each worker process serves its own on METRICS_PORT + its index.
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9464'))
+
+# Seconds; covers a cached read up to a slow upload
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate from the buckets, interpolating inside the one the quantile falls in"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else lower * 2 or 1.0
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+class Metrics:
+    """Histograms and counters by name and labels, rendered in Prometheus text format.
+
+    observe() and inc() are called from the event loop and DB threads alike.
+    Gauges are read from callbacks when the metrics are rendered, so the
+    existing stats() and snapshot() methods can be exported as they are.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Callable[[], Dict[Labels, float]]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.labels: Labels = ()
+
+    @staticmethod
+    def _labels(labels: dict) -> Labels:
+        return tuple(sorted(labels.items()))
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def gauge(self, name: str, read: Callable[[], Dict[Labels, float]], help_text: str = ''):
+        """Register a gauge whose samples, {labels: value}, are read at render time"""
+        self._gauges[name] = read
+        if help_text:
+            self.describe(name, help_text)
+
+    def gauge_stats(self, name: str, read: Callable[[], dict], help_text: str = ''):
+        """Export a stats()/snapshot() dict as a gauge labelled by stat, flattening nested dicts"""
+        def samples() -> Dict[Labels, float]:
+            flat = {}
+            for key, value in read().items():
+                if isinstance(value, dict):
+                    flat.update({(('stat', f"{key}_{inner}"),): v for inner, v in value.items()})
+                else:
+                    flat[(('stat', key),)] = value
+            return flat
+        self.gauge(name, samples, help_text)
+
+    def histograms(self, name: str) -> Dict[Labels, Histogram]:
+        with self._lock:
+            return dict(self._histograms.get(name, {}))
+
+    def counters(self, name: str) -> Dict[Labels, float]:
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+    def _format(self, name: str, labels: Labels, value: float) -> str:
+        labels = self.labels + labels
+        if labels:
+            text = ','.join(f'{k}="{str(v)}"' for k, v in labels)
+            return f"{name}{{{text}}} {value:g}"
+        return f"{name} {value:g}"
+
+    def _header(self, name: str, kind: str) -> List[str]:
+        lines = [f"# HELP {name} {self._help[name]}"] if name in self._help else []
+        return lines + [f"# TYPE {name} {kind}"]
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            counters = {name: dict(series) for name, series in self._counters.items()}
+        for name, series in sorted(histograms.items()):
+            lines += self._header(name, 'histogram')
+            for labels, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                    lines.append(self._format(f"{name}_bucket", labels + (('le', le),), cumulative))
+                lines.append(self._format(f"{name}_sum", labels, histogram.sum))
+                lines.append(self._format(f"{name}_count", labels, histogram.count))
+        for name, series in sorted(counters.items()):
+            lines += self._header(name, 'counter')
+            lines += [self._format(name, labels, value) for labels, value in sorted(series.items())]
+        for name, read in sorted(self._gauges.items()):
+            try:
+                samples = read()
+            except Exception:
+                logger.exception("Error reading gauge %s", name)
+                continue
+            lines += self._header(name, 'gauge')
+            lines += [self._format(name, labels, value) for labels, value in sorted(samples.items())]
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+metrics.describe('bot_handler_seconds', "Time spent in each update handler")
+metrics.describe('bot_handler_errors_total', "Handler calls that raised")
+metrics.describe('db_query_seconds', "Time of each DatabaseManager method, including waiting for the writer")
+metrics.describe('bot_api_seconds', "Bot API call duration, after rate limiting")
+metrics.describe('bot_api_errors_total', "Bot API calls that failed, by error type")
+
+def timed(name: str, func: Callable, **labels) -> Callable:
+    """Wrap a sync or async callable to record its duration in histogram `name`"""
+    if inspect.iscoroutinefunction(inspect.unwrap(func)):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - start, **labels)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.observe(name, time.perf_counter() - start, **labels)
+    return wrapper
+
+def timed_methods(name: str, label: str = 'method'):
+    """Class decorator timing every public method, and _load_* helpers, in histogram `name`"""
+    def decorate(cls):
+        for attr, value in list(vars(cls).items()):
+            public = not attr.startswith('_') or attr.startswith('_load_')
+            if public and callable(value) and not isinstance(value, (staticmethod, classmethod, type)):
+                setattr(cls, attr, timed(name, value, **{label: attr}))
+        return cls
+    return decorate
+
+def handler_name(callback: Callable) -> str:
+    # Through require_auth/admin_only to the function they guard
+    return getattr(inspect.unwrap(callback), '__qualname__', repr(callback))
+
+def _instrument_callback(callback: Callable) -> Callable:
+    name = handler_name(callback)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception as e:
+            metrics.inc('bot_handler_errors_total', handler=name, error=type(e).__name__)
+            raise
+        finally:
+            metrics.observe('bot_handler_seconds', time.perf_counter() - start, handler=name)
+    return wrapper
+
+def instrument_handler(handler: BaseHandler):
+    """Time the callback of a handler; for a ConversationHandler, of every handler inside it"""
+    if isinstance(handler, ConversationHandler):
+        inner = list(handler.entry_points) + list(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            inner += state_handlers
+        for child in inner:
+            instrument_handler(child)
+    elif not getattr(handler.callback, '_instrumented', False):
+        handler.callback = _instrument_callback(handler.callback)
+        handler.callback._instrumented = True
+
+def instrument_application(app):
+    """Time every handler registered on the application"""
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            instrument_handler(handler)
+
+class MetricsServer:
+    """Serves metrics.render() at /metrics for Prometheus to scrape"""
+
+    def __init__(self, listen: str = METRICS_LISTEN, port: int = METRICS_PORT):
+        self.listen = listen
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+
+    async def start(self):
+        if not self.port:
+            return
+        web_app = web.Application()
+        web_app.router.add_get('/metrics', self.handle)
+        self._runner = web.AppRunner(web_app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.listen, self.port).start()
+        except OSError as e:
+            # Metrics are not worth failing the bot over
+            logger.warning("Metrics endpoint not started on %s:%s: %s", self.listen, self.port, e)
+            await self.stop()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+metrics_server = MetricsServer()
+
+def set_worker(index: int):
+    """Label this worker process's metrics and give it its own endpoint port"""
+    metrics.labels = (('worker', str(index)),)
+    if metrics_server.port:
+        metrics_server.port += index
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict
+from telegram.error import RetryAfter, TimedOut
+from telegram.ext import BaseRateLimiter
+from utils.metrics import metrics
+
+# Priority lanes, passed per call as rate_limit_args={'priority': BULK}
+INTERACTIVE, BULK = 0, 1
+LANES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def try_acquire(self) -> float:
+        """Take a token and return 0, or return how long to wait for one."""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_idle(self) -> bool:
+        now = time.monotonic()
+        return now >= self.blocked_until and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+class OutboundScheduler(BaseRateLimiter[Dict[str, Any]]):
+    """Rate limiter every Bot API call goes through.
+
+    Requests that target a chat take a token from a global bucket (Telegram
+    allows ~30 messages/s per bot) and from that chat's bucket (~1 message/s
+    in private chats, 20/minute in groups). Interactive replies are served
+    before bulk sends while both wait for the global bucket. RetryAfter pauses
+    the chat and the global bucket and retries, since Telegram does not say
+    which limit was hit; TimedOut retries with exponential backoff, which
+    can duplicate a message whose response was lost.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        group_rate: float = 20 / 60,
+        max_retries: int = 3,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._waiting = {lane: 0 for lane in LANES}
+        self._chat_waiting = 0
+        self.sent = 0
+        self.retries = 0
+        self.failures = 0
+        self.wait_time = 0.0
+
+    def share_rates(self, processes: int):
+        """Keep to 1/processes of the global and group limits, for one of several processes sending as the same bot.
+
+        Workers are chosen by user, so a private chat, whose id is its user's,
+        is sent to by one process only and keeps its whole limit, while every
+        process may send to the same group.
+        """
+        self.global_rate /= processes
+        self._global = TokenBucket(self.global_rate, max(1.0, self.global_rate))
+        self.group_rate /= processes
+        self.group_burst = max(1.0, self.chat_burst / processes)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                self._chats = {key: b for key, b in self._chats.items() if not b.is_idle()}
+            # Negative ids are groups and channels, which have a per-minute limit
+            is_group = isinstance(chat_id, int) and chat_id < 0
+            if is_group:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id, priority: int):
+        start = time.monotonic()
+        self._chat_waiting += 1
+        try:
+            bucket = self._chat_bucket(chat_id)
+            while (wait := bucket.try_acquire()) > 0:
+                await asyncio.sleep(wait)
+        finally:
+            self._chat_waiting -= 1
+
+        self._waiting[priority] += 1
+        try:
+            while True:
+                # Lower lanes step aside while a higher lane is waiting
+                if any(self._waiting[lane] for lane in LANES if lane < priority):
+                    await asyncio.sleep(1 / self.global_rate)
+                    continue
+                wait = self._global.try_acquire()
+                if wait == 0:
+                    break
+                await asyncio.sleep(wait)
+        finally:
+            self._waiting[priority] -= 1
+            self.wait_time += time.monotonic() - start
+
+    @staticmethod
+    async def _call(callback, args, kwargs, endpoint: str):
+        start = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception as e:
+            metrics.inc('bot_api_errors_total', method=endpoint, error=type(e).__name__)
+            raise
+        finally:
+            metrics.observe('bot_api_seconds', time.perf_counter() - start, method=endpoint)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = (rate_limit_args or {}).get('priority', INTERACTIVE)
+        chat_id = data.get('chat_id')
+
+        attempt = 0
+        while True:
+            # Calls without a chat (getUpdates, answerCallbackQuery, ...) are not throttled
+            if chat_id is not None:
+                await self._acquire(chat_id, priority)
+            try:
+                result = await self._call(callback, args, kwargs, endpoint)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                delay = float(e.retry_after)
+                self._global.block(delay)
+                if chat_id is not None:
+                    self._chat_bucket(chat_id).block(delay)
+                else:
+                    await asyncio.sleep(delay)
+            except TimedOut:
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                await asyncio.sleep(0.5 * 2 ** attempt)
+            attempt += 1
+            self.retries += 1
+
+    def snapshot(self) -> dict:
+        return {
+            'queue_depth': {name: self._waiting[lane] for lane, name in LANES.items()},
+            'waiting_on_chat_limit': self._chat_waiting,
+            'tracked_chats': len(self._chats),
+            'sent': self.sent,
+            'retries': self.retries,
+            'failures': self.failures,
+            'wait_seconds': self.wait_time,
+        }
+
+outbound_scheduler = OutboundScheduler(
+    global_rate=float(os.getenv('OUTBOUND_GLOBAL_RATE', '30')),
+    chat_rate=float(os.getenv('OUTBOUND_CHAT_RATE', '1')),
+)
@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Message, Update
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+from utils.media import send_photo_group
+
+PAGE_SIZE = 5
+VIEW_BUTTONS_PER_ROW = 5
+# Pager states kept per user; older list messages stop paging once evicted
+MAX_PAGERS_PER_USER = 5
+
+@dataclass
+class PagerSource:
+    """How a list view fetches and renders one page.
+
+    fetch(params, cursor, limit) returns rows after `cursor` (None for the
+    first page); cursor_of(row) returns the keyset cursor of a row and
+    render_item(number, row) returns the text block and recipe id of a row.
+    marked(params), if set, returns recipe ids whose view button gets a star.
+
+    Sources with photo_of render in media group mode: the photos of a page
+    (photo_of(row) returns (file_id, path) or None) go out as one media group
+    followed by the index message. Newly uploaded photos are reported to
+    on_new_file_id(recipe_id, file_id).
+    """
+    fetch: Callable[[dict, Optional[tuple], int], Awaitable[List[tuple]]]
+    cursor_of: Callable[[tuple], tuple]
+    render_item: Callable[[int, tuple], Tuple[str, int]]
+    header: Callable[[dict], str]
+    empty_text: str
+    marked: Optional[Callable[[dict], Awaitable[frozenset]]] = None
+    page_size: int = PAGE_SIZE
+    photo_of: Optional[Callable[[tuple], Optional[Tuple[Optional[str], Optional[str]]]]] = None
+    on_new_file_id: Optional[Callable[[int, str], Awaitable]] = None
+
+_sources: Dict[str, PagerSource] = {}
+
+def register_pager(kind: str, source: PagerSource):
+    _sources[kind] = source
+
+async def _fetch_page(kind: str, params: dict, cursor: Optional[tuple]) -> Tuple[List[tuple], bool]:
+    page_size = _sources[kind].page_size
+    rows = await _sources[kind].fetch(params, cursor, page_size + 1)
+    return rows[:page_size], len(rows) > page_size
+
+async def _render_page(kind: str, params: dict, rows: List[tuple], page: int, has_next: bool):
+    source = _sources[kind]
+    marked = await source.marked(params) if source.marked else frozenset()
+    blocks = []
+    buttons = []
+    for offset, row in enumerate(rows):
+        number = page * source.page_size + offset + 1
+        text, recipe_id = source.render_item(number, row)
+        blocks.append(text)
+        label = f"👁 {number}⭐️" if recipe_id in marked else f"👁 {number}"
+        buttons.append(InlineKeyboardButton(label, callback_data=f"view_recipe_{recipe_id}"))
+
+    text = f"{source.header(params)}\n📄 صفحه {page + 1}\n\n" + "\n\n".join(blocks)
+
+    keyboard = [buttons[i:i + VIEW_BUTTONS_PER_ROW] for i in range(0, len(buttons), VIEW_BUTTONS_PER_ROW)]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("◀️ قبلی", callback_data="page_prev"))
+    if has_next:
+        nav.append(InlineKeyboardButton("بعدی ▶️", callback_data="page_next"))
+    if nav:
+        keyboard.append(nav)
+    return text, InlineKeyboardMarkup(keyboard)
+
+def _caption(text: str) -> str:
+    # Titles have no length cap; a caption over the limit fails the whole media group
+    if len(text) <= MessageLimit.CAPTION_LENGTH:
+        return text
+    return text[:MessageLimit.CAPTION_LENGTH - 1] + '…'
+
+async def _send_page_photos(message: Message, kind: str, rows: List[tuple], page: int):
+    """Send the photos of a page as one media group, captioned with their item numbers"""
+    source = _sources[kind]
+    photos = []
+    for offset, row in enumerate(rows):
+        photo = source.photo_of(row)
+        if photo:
+            number = page * source.page_size + offset + 1
+            _, recipe_id = source.render_item(number, row)
+            photos.append((recipe_id, photo[0], photo[1], _caption(f"{number}. {row[1]}")))
+    if photos:
+        await send_photo_group(message, photos, source.on_new_file_id)
+
+def _remember_pager(context: ContextTypes.DEFAULT_TYPE, message_id: int, state: dict):
+    pagers = context.user_data.setdefault('pagers', {})
+    pagers[message_id] = state
+    while len(pagers) > MAX_PAGERS_PER_USER:
+        del pagers[min(pagers)]
+
+async def send_pager(message: Message, context: ContextTypes.DEFAULT_TYPE, kind: str, params: dict) -> bool:
+    """Send the first page of a list view as a single message.
+
+    Returns False (after telling the user) when the list is empty.
+    """
+    rows, has_next = await _fetch_page(kind, params, None)
+    if not rows:
+        await message.reply_text(_sources[kind].empty_text)
+        return False
+
+    if _sources[kind].photo_of:
+        await _send_page_photos(message, kind, rows, 0)
+
+    text, reply_markup = await _render_page(kind, params, rows, 0, has_next)
+    sent = await message.reply_text(text, reply_markup=reply_markup)
+
+    _remember_pager(context, sent.message_id, {
+        'kind': kind,
+        'params': params,
+        # cursors[n] is the keyset cursor that page n starts after
+        'cursors': [None, _sources[kind].cursor_of(rows[-1])],
+        'page': 0,
+    })
+    return True
+
+async def handle_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Move a list message to the previous or next page by editing it in place.
+
+    In media group mode the page's photos and a fresh index message are sent
+    instead, since a media group cannot be edited into another page.
+    """
+    query = update.callback_query
+    state = context.user_data.get('pagers', {}).get(query.message.message_id)
+    if not state:
+        await query.answer("این فهرست منقضی شده است. لطفاً دوباره درخواست دهید.")
+        return
+    await query.answer()
+
+    page = state['page'] + (1 if query.data == 'page_next' else -1)
+    if page < 0 or page >= len(state['cursors']):
+        return
+
+    kind, params = state['kind'], state['params']
+    rows, has_next = await _fetch_page(kind, params, state['cursors'][page])
+    if not rows:
+        return
+
+    state['page'] = page
+    if page + 1 == len(state['cursors']):
+        state['cursors'].append(_sources[kind].cursor_of(rows[-1]))
+    else:
+        state['cursors'][page + 1] = _sources[kind].cursor_of(rows[-1])
+
+    text, reply_markup = await _render_page(kind, params, rows, page, has_next)
+    if _sources[kind].photo_of:
+        await _send_page_photos(query.message, kind, rows, page)
+        sent = await query.message.reply_text(text, reply_markup=reply_markup)
+        del context.user_data['pagers'][query.message.message_id]
+        _remember_pager(context, sent.message_id, state)
+        return
+
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            raise e
@@ -0,0 +1,39 @@
+import os
+from typing import Any, Callable
+from utils.cache import TTLCache
+
+class RenderCache:
+    """Finished recipe cards by (recipe_id, updated_at, view_kind).
+
+    The views of a recipe are stored together so a write can drop all of
+    them at once with invalidate(). Keying on updated_at also retires cards
+    of rows changed by another process. Only cards that are the same for
+    every viewer belong here; per-user parts such as favorite buttons are
+    added by the caller.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str = None):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name=name)
+
+    def get(self, recipe_id: int, updated_at, view_kind: str, render: Callable[[], Any]) -> Any:
+        """Return the cached card, calling render() to build it on a miss"""
+        entry = self._cache.get(recipe_id)
+        if entry is None or entry[0] != updated_at:
+            entry = (updated_at, {})
+            self._cache.set(recipe_id, entry)
+        views = entry[1]
+        if view_kind not in views:
+            views[view_kind] = render()
+        return views[view_kind]
+
+    def invalidate(self, recipe_id: int):
+        self._cache.invalidate(recipe_id)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+render_cache = RenderCache(
+    maxsize=int(os.getenv('RENDER_CACHE_SIZE', '5000')),
+    ttl=float(os.getenv('RENDER_CACHE_TTL', '3600')),
+    name='render'
+)
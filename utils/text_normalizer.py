@@ -0,0 +1,37 @@
+import re
+
+# Arabic letter forms and Persian/Arabic digits mapped to the single form we
+# store and search with.
+_CHAR_MAP = {
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+}
+_CHAR_MAP.update({chr(0x06F0 + i): str(i) for i in range(10)})  # ۰-۹
+_CHAR_MAP.update({chr(0x0660 + i): str(i) for i in range(10)})  # ٠-٩
+
+# Zero-width non-joiner separates the parts of compound words; treat it as a
+# word boundary so "قورمه‌سبزی" and "قورمه سبزی" index the same words.
+_CHAR_MAP['\u200c'] = ' '
+
+# Characters dropped entirely: diacritics (harakat, tanwin, shadda, sukun,
+# superscript alef), tatweel and zero-width/direction marks.
+_REMOVED = [chr(c) for c in range(0x064B, 0x0660)] + [
+    '\u0670', '\u0640',
+    '\u200d', '\u200e', '\u200f', '\ufeff',
+]
+
+_TRANSLATION = str.maketrans({**_CHAR_MAP, **{c: None for c in _REMOVED}})
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_text(text: str) -> str:
+    """Normalize Persian/Arabic text for indexing and searching.
+
+    The same function must be applied to stored text and to queries.
+    """
+    if not text:
+        return ''
+    text = str(text).translate(_TRANSLATION).casefold()
+    return _WHITESPACE.sub(' ', text).strip()
@@ -0,0 +1,135 @@
+import asyncio
+import hmac
+import logging
+import os
+import signal
+from typing import Awaitable, Callable, Optional
+from aiohttp import web
+from telegram import Bot, Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+# Selected with BOT_MODE=webhook. WEBHOOK_URL is the public https base that
+# Telegram posts to; leave it empty to serve without registering the webhook,
+# e.g. to POST recorded updates to a local instance.
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+
+# Telegram sends the secret_token given to setWebhook in this header
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+class WebhookServer:
+    """Embedded HTTP server that feeds webhook updates to an Application.
+
+    Requests without the secret token are refused. A valid update is put on
+    the application's update queue, where it is dispatched to the handlers
+    exactly like a polled one, and acknowledged at once; Telegram does not
+    wait for the handler to finish.
+    """
+
+    def __init__(self, app: Optional[Application], secret_token: str,
+                 listen: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT, path: str = WEBHOOK_PATH):
+        if not secret_token:
+            raise ValueError("A webhook secret token is required (WEBHOOK_SECRET)")
+        self.app = app
+        self.secret_token = secret_token
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self._runner: Optional[web.AppRunner] = None
+
+    async def deliver(self, data: dict):
+        """Hand a webhook update to the application; raises if the payload is not an update"""
+        update = Update.de_json(data, self.app.bot)
+        if update is None:
+            raise ValueError("empty update")
+        await self.app.update_queue.put(update)
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            return web.Response(status=403)
+        try:
+            await self.deliver(await request.json())
+        except Exception as e:
+            logger.warning("Rejected webhook payload: %s", e)
+            return web.Response(status=400)
+        return web.Response()
+
+    async def register(self, bot: Bot, url: str):
+        """Point Telegram's webhook for the bot at `url` plus this server's path"""
+        await bot.set_webhook(
+            url.rstrip('/') + self.path,
+            secret_token=self.secret_token,
+            allowed_updates=Update.ALL_TYPES
+        )
+
+    async def start(self):
+        web_app = web.Application()
+        web_app.router.add_post(self.path, self.handle_update)
+        self._runner = web.AppRunner(web_app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        # With port 0 the OS picks a free port; report the real one
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+def stop_on_signals() -> asyncio.Event:
+    """An event that SIGINT or SIGTERM sets"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    return stop
+
+async def run_application(app: Application, stop: asyncio.Event,
+                          started: Callable[[], Awaitable] = None,
+                          stopping: Callable[[], Awaitable] = None):
+    """Run an application without its updater until `stop` is set.
+
+    Mirrors Application.run_polling: post_init, post_stop and post_shutdown
+    run at the same points. post_shutdown comes after shutdown(), which
+    makes the last persistence flush. started() runs once it processes
+    updates, stopping() before it stops; queued updates are still handled
+    after that.
+    """
+    await app.initialize()
+    try:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        if started:
+            await started()
+        await stop.wait()
+    finally:
+        if stopping:
+            await stopping()
+        if app.running:
+            await app.stop()
+            if app.post_stop:
+                await app.post_stop(app)
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+async def serve_webhook(app: Application, server: WebhookServer, url: str = WEBHOOK_URL,
+                        stop: Optional[asyncio.Event] = None):
+    """Run the application behind the webhook server until SIGINT/SIGTERM or `stop` is set"""
+    async def started():
+        # Listening before setWebhook, or Telegram's first deliveries fail
+        # and wait for its retry backoff
+        await server.start()
+        if url:
+            await server.register(app.bot, url)
+        logger.info("Webhook listening on %s:%s%s", server.listen, server.port, server.path)
+
+    await run_application(app, stop or stop_on_signals(), started, server.stop)
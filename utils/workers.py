@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Callable, List, Optional
+from telegram import Bot, Update
+from telegram.error import NetworkError
+from telegram.ext import ApplicationBuilder
+from utils import cache, metrics
+from utils.logs import setup_logging
+from utils.outbound import outbound_scheduler
+from utils.webhook import WebhookServer, run_application, stop_on_signals
+
+logger = logging.getLogger(__name__)
+
+# With more than one worker, bot.py runs a supervisor that receives updates
+# and hands each to one of BOT_WORKERS processes running the handlers.
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '1'))
+# Seconds before respawning a worker that died within this long of starting
+RESPAWN_DELAY = float(os.getenv('WORKER_RESPAWN_DELAY', '5'))
+
+def routing_key(data: dict) -> int:
+    """The user who sent a raw update, or its chat for updates without a user.
+
+    python-telegram-bot keys user_data by user and conversations by chat and
+    user, so routing by user keeps both in one process, as well as the
+    chat_data of private chats, whose id is the user's. chat_data of a group
+    is only consistent for what one user's updates do with it; the handlers
+    use chat_data only in private conversations.
+    """
+    for kind, value in data.items():
+        if kind == 'update_id' or not isinstance(value, dict):
+            continue
+        user = value.get('from') or value.get('user')
+        if user:
+            return user['id']
+        # Channel posts and the like: the chat, or that of the carried message
+        message = value.get('message') if kind == 'callback_query' else value
+        chat = (message or {}).get('chat')
+        if chat:
+            return chat['id']
+    return 0
+
+def run_worker(index: int, workers: int, conn, make_builder: Optional[Callable[[], ApplicationBuilder]] = None):
+    """Entry point of a worker process: the full handler tree, fed updates by the supervisor"""
+    # Ctrl+C reaches the whole process group; the supervisor decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_logging(worker=index)
+    asyncio.run(_serve_worker(index, workers, conn, make_builder))
+
+async def _serve_worker(index: int, workers: int, conn, make_builder):
+    import bot  # bot.py imports this module
+
+    send_lock = threading.Lock()
+
+    def send(message):
+        # Invalidations come from DB executor threads as well as the loop
+        with send_lock:
+            conn.send(message)
+
+    cache.set_invalidation_listener(lambda name, key: send(('invalidate', name, key)))
+    outbound_scheduler.share_rates(workers)
+    metrics.set_worker(index)
+
+    builder = make_builder() if make_builder else ApplicationBuilder().token(bot.BOT_TOKEN)
+    app = bot.build_application(builder.updater(None))
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+
+    def dispatch(message):
+        if message[0] == 'update':
+            app.update_queue.put_nowait(Update.de_json(message[1], app.bot))
+        elif message[0] == 'invalidate':
+            cache.apply_invalidation(message[1], message[2])
+
+    def receive():
+        try:
+            while (message := conn.recv()) is not None:
+                loop.call_soon_threadsafe(dispatch, message)
+        except EOFError:
+            logger.warning("Worker %s: supervisor went away", index)
+        # Queued after every update received, so those are still handled
+        loop.call_soon_threadsafe(stop.set)
+
+    async def started():
+        threading.Thread(target=receive, name='worker-receive', daemon=True).start()
+        send(('ready', index))
+
+    await run_application(app, stop, started)
+
+class WorkerHandle:
+    """A worker process and the pipe to it, written by its own thread so routing never blocks.
+
+    The handle outlives its process: when the supervisor respawns a worker,
+    updates still in the outbox go to the new process, in order.
+    """
+
+    def __init__(self, ctx, index: int, workers: int, make_builder,
+                 on_message: Callable, on_exit: Callable):
+        self.index = index
+        self._ctx = ctx
+        self._args = (index, workers)
+        self._make_builder = make_builder
+        self.conn = None
+        self.process = None
+        self.started_at = 0.0
+        self.ready = threading.Event()
+        self._outbox: queue.SimpleQueue = queue.SimpleQueue()
+        self._respawned = threading.Condition()
+        self._on_message = on_message
+        self._on_exit = on_exit
+
+    def start(self):
+        self.spawn()
+        threading.Thread(target=self._write, name=f"worker-{self.index}-out", daemon=True).start()
+
+    def spawn(self):
+        """Start a worker process at this index, replacing one that exited"""
+        conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=run_worker, args=(*self._args, child_conn, self._make_builder),
+            name=f"bot-worker-{self.index}"
+        )
+        self.ready.clear()
+        process.start()
+        # Only the child's copy stays open, so the pipe ends with the process
+        child_conn.close()
+        self.started_at = time.monotonic()
+        with self._respawned:
+            self.conn, self.process = conn, process
+            self._respawned.notify_all()
+        threading.Thread(
+            target=self._read, args=(conn, process), name=f"worker-{self.index}-in", daemon=True
+        ).start()
+
+    def send(self, message):
+        self._outbox.put(message)
+
+    def _write(self):
+        while True:
+            message = self._outbox.get()
+            while True:
+                conn = self.conn
+                try:
+                    conn.send(message)
+                    break
+                except (BrokenPipeError, OSError):
+                    # The process died; wait for its replacement
+                    with self._respawned:
+                        self._respawned.wait_for(lambda: self.conn is not conn)
+            if message is None:
+                return
+
+    def _read(self, conn, process):
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == 'ready':
+                    self.ready.set()
+                else:
+                    self._on_message(self, message)
+        except (EOFError, OSError):
+            pass
+        process.join()
+        self._on_exit(self, process.exitcode)
+
+class Supervisor:
+    """Fans updates out to worker processes by the user who sent them.
+
+    Each worker is a separate process with the whole handler tree, its own
+    connection pool and its own database writer; SQLite coordinates their
+    writes. Cache invalidations a worker makes are forwarded to the others
+    so no process keeps serving a banned user or a stale favorites list.
+    A worker that dies is respawned at the same index, so its users keep
+    their routing; updates it had received but not handled are lost.
+    """
+
+    def __init__(self, workers: int, make_builder: Optional[Callable[[], ApplicationBuilder]] = None):
+        ctx = multiprocessing.get_context('spawn')
+        self.workers: List[WorkerHandle] = [
+            WorkerHandle(ctx, index, workers, make_builder, self._on_message, self._on_exit)
+            for index in range(workers)
+        ]
+        self.dispatched = 0
+        self.restarts = 0
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def _on_message(self, sender: WorkerHandle, message):
+        if message[0] == 'invalidate':
+            for worker in self.workers:
+                if worker is not sender:
+                    worker.send(message)
+
+    def _on_exit(self, worker: WorkerHandle, exitcode: Optional[int]):
+        if self._stopping:
+            return
+        # A worker that keeps crashing on startup is not restarted in a tight loop
+        delay = RESPAWN_DELAY if time.monotonic() - worker.started_at < RESPAWN_DELAY else 0
+        logger.error("Worker %s exited with code %s, restarting it in %.0f s", worker.index, exitcode, delay)
+        time.sleep(delay)
+        with self._lock:
+            if self._stopping:
+                return
+            worker.spawn()
+            self.restarts += 1
+
+    def start(self, timeout: float = 60):
+        """Start the workers and wait until each one handles updates"""
+        for worker in self.workers:
+            worker.start()
+        for worker in self.workers:
+            if not worker.ready.wait(timeout):
+                raise RuntimeError(f"Worker {worker.index} did not start")
+
+    def worker_for(self, data: dict) -> int:
+        """Index of the worker that handles an update"""
+        return routing_key(data) % len(self.workers)
+
+    def dispatch(self, data: dict):
+        self.workers[self.worker_for(data)].send(('update', data))
+        self.dispatched += 1
+
+    def stop(self):
+        """Let the workers finish their queued updates, then wait for them to exit"""
+        with self._lock:
+            self._stopping = True
+        for worker in self.workers:
+            worker.send(None)
+        for worker in self.workers:
+            worker.process.join()
+
+class SupervisorWebhookServer(WebhookServer):
+    """Webhook server that routes raw updates to the workers instead of an application"""
+
+    def __init__(self, supervisor: Supervisor, secret_token: str, **kwargs):
+        super().__init__(None, secret_token, **kwargs)
+        self.supervisor = supervisor
+
+    async def deliver(self, data: dict):
+        if not isinstance(data, dict) or 'update_id' not in data:
+            raise ValueError("not an update")
+        self.supervisor.dispatch(data)
+
+async def _poll(bot: Bot, supervisor: Supervisor):
+    await bot.delete_webhook()
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=10, allowed_updates=Update.ALL_TYPES)
+        except NetworkError as e:
+            logger.warning("Error polling updates: %s", e)
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            supervisor.dispatch(update.to_dict())
+            offset = update.update_id + 1
+
+async def run_supervisor(token: str, workers: int, webhook: bool = False,
+                         secret_token: str = '', webhook_url: str = ''):
+    """Receive updates by polling or webhook and fan them out until SIGINT/SIGTERM"""
+    supervisor = Supervisor(workers)
+    server = SupervisorWebhookServer(supervisor, secret_token) if webhook else None
+    await asyncio.to_thread(supervisor.start)
+    stop = stop_on_signals()
+    logger.info("Supervisor running %s workers", workers)
+    try:
+        async with Bot(token) as bot:
+            if server is not None:
+                if webhook_url:
+                    await server.register(bot, webhook_url)
+                await server.start()
+                await stop.wait()
+            else:
+                polling = asyncio.create_task(_poll(bot, supervisor))
+                stopped = asyncio.create_task(stop.wait())
+                await asyncio.wait((polling, stopped), return_when=asyncio.FIRST_COMPLETED)
+                stopped.cancel()
+                if polling.done():
+                    polling.result()  # re-raise what ended polling
+                polling.cancel()
+    finally:
+        if server is not None:
+            await server.stop()
+        await asyncio.to_thread(supervisor.stop)
+        logger.info("Supervisor dispatched %s updates, restarted %s workers",
+                    supervisor.dispatched, supervisor.restarts)